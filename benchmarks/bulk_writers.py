@@ -0,0 +1,109 @@
+"""
+Benchmark of one-row-per-transaction writers (insert_user, insert_channel) against
+the batched writers (insert_users, insert_channels, insert_catalogue_aliases).
+
+Needs a Postgres loaded with postgres/sql/create_tables.sql, configured with the
+same POSTGRES_* environment variables as the bot. Run from the repository root:
+
+    python benchmarks/bulk_writers.py --rows 10000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import asyncpg
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from database import writers  # noqa: E402
+from database.cache import CatalogueAliasIndex, GuildMembership  # noqa: E402
+
+# Real snowflakes and department names, cache NOTIFY payloads grow with them
+GUILD_ID = 928374650192837465
+BASE_ID = 10**17
+DEPARTMENTS = ("I&C SCI", "COMPSCI", "IN4MATX", "EECS", "BIO SCI", "MATH", "PHYSICS")
+
+
+async def per_row_users(bot, rows: int) -> None:
+    for i in range(rows):
+        await writers.insert_user(bot, GUILD_ID, BASE_ID + i)
+
+
+async def per_row_channels(bot, rows: int) -> None:
+    for i in range(rows):
+        await writers.insert_channel(bot, GUILD_ID, BASE_ID + i)
+
+
+async def batched_users(bot, rows: int) -> None:
+    await writers.insert_users(bot, GUILD_ID, range(BASE_ID, BASE_ID + rows))
+
+
+async def batched_channels(bot, rows: int) -> None:
+    await writers.insert_channels(bot, GUILD_ID, range(BASE_ID, BASE_ID + rows))
+
+
+async def batched_aliases(bot, rows: int) -> None:
+    departments = (DEPARTMENTS[i % len(DEPARTMENTS)] for i in range(rows))
+    await writers.insert_catalogue_aliases(
+        bot,
+        GUILD_ID,
+        {f"{dept.lower()} alias {i}": dept for i, dept in enumerate(departments)},
+    )
+
+
+async def reset(pool: asyncpg.Pool) -> None:
+    async with pool.acquire() as conn:
+        await conn.execute("DELETE FROM users WHERE guild_id = $1", GUILD_ID)
+        await conn.execute("DELETE FROM channels WHERE guild_id = $1", GUILD_ID)
+        await conn.execute("DELETE FROM catalogue_alias WHERE guild_id = $1", GUILD_ID)
+
+
+async def main(args: argparse.Namespace) -> None:
+    pool = await asyncpg.create_pool(
+        user=os.environ.get("POSTGRES_USER", "peter"),
+        password=os.environ.get("POSTGRES_PASSWORD"),
+        host=os.environ.get("POSTGRES_HOST", "127.0.0.1"),
+        port=os.environ.get("POSTGRES_PORT", "5432"),
+        database=os.environ.get("POSTGRES_DB", "peterbot"),
+    )
+    bot = SimpleNamespace(
+        db_pool=pool,
+        instance_id="benchmark",
+        peter_users=GuildMembership(),
+        peter_channels=GuildMembership(),
+        peter_catalogue_aliases=CatalogueAliasIndex(),
+    )
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "INSERT INTO guilds VALUES ($1, false) ON CONFLICT DO NOTHING", GUILD_ID
+        )
+    cases = (
+        ("insert_user", per_row_users),
+        ("insert_users", batched_users),
+        ("insert_users (rerun)", batched_users),
+        ("insert_channel", per_row_channels),
+        ("insert_channels", batched_channels),
+        ("insert_aliases", batched_aliases),
+    )
+    try:
+        await reset(pool)
+        for name, run in cases:
+            if not name.endswith("(rerun)"):
+                await reset(pool)
+            start = time.perf_counter()
+            await run(bot, args.rows)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<22} {args.rows / elapsed:>10.1f} rows/s   {elapsed:.3f}s")
+    finally:
+        await reset(pool)
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    asyncio.run(main(parser.parse_args()))
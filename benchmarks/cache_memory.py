@@ -0,0 +1,104 @@
+"""
+Memory used by the in-memory table caches, as the plain dictionaries they used to
+be against the slotted records and indexes of database.cache.
+
+Needs no database. Run from the repository root:
+
+    python benchmarks/cache_memory.py --entries 100000
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+from collections import defaultdict
+from typing import Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from database.cache import (  # noqa: E402
+    GuildConfig,
+    GuildMembership,
+    VoiceChannelIndex,
+    VoiceChannelLink,
+)
+
+# Snowflakes are large enough to never hit the small int cache
+BASE_ID = 10**17
+
+
+def guilds_dict(n: int):
+    results = defaultdict(dict)
+    for i in range(n):
+        results[BASE_ID + i]["watch_mode"] = False
+        results[BASE_ID + i]["log_retention_days"] = None
+    return results
+
+
+def guilds_slotted(n: int):
+    return {BASE_ID + i: GuildConfig(BASE_ID + i) for i in range(n)}
+
+
+def users_dict(n: int):
+    results = defaultdict(set)
+    for i in range(n):
+        results[BASE_ID + i % 1000].add(BASE_ID + i)
+    return results
+
+
+def users_slotted(n: int):
+    results = GuildMembership()
+    for i in range(n):
+        results.add(BASE_ID + i % 1000, BASE_ID + i)
+    return results
+
+
+def voice_dict(n: int):
+    results = defaultdict(dict)
+    for i in range(n):
+        results[BASE_ID + i % 1000][BASE_ID + i] = {
+            "text_id": BASE_ID + n + i,
+            "role_id": BASE_ID + 2 * n + i,
+        }
+    return results
+
+
+def voice_slotted(n: int):
+    results = VoiceChannelIndex()
+    for i in range(n):
+        results.add(
+            VoiceChannelLink(
+                BASE_ID + i, BASE_ID + i % 1000, BASE_ID + n + i, BASE_ID + 2 * n + i
+            )
+        )
+    return results
+
+
+def measure(build: Callable[[int], object], n: int) -> float:
+    """Bytes per entry still allocated once the cache is built"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    cache = build(n)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del cache
+    return (after - before) / n
+
+
+def main(args: argparse.Namespace) -> None:
+    cases = (
+        ("guilds", guilds_dict, guilds_slotted),
+        ("users", users_dict, users_slotted),
+        ("voice_channels", voice_dict, voice_slotted),
+    )
+    print(f"{args.entries} entries, bytes per entry")
+    for name, before, after in cases:
+        old = measure(before, args.entries)
+        new = measure(after, args.entries)
+        print(f"{name:<16} dict {old:>8.1f}   slotted {new:>8.1f}   {new / old:>5.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=100000)
+    main(parser.parse_args())
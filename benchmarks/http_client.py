@@ -0,0 +1,95 @@
+"""
+Benchmark of a fresh aiohttp.ClientSession per request (the old PeterPortalAPI
+and Course.detail behaviour) against the shared, pooled utils.http.HTTPClient.
+
+A local stub server stands in for PeterPortal so the numbers only reflect
+client-side connection handling. Run from the repository root:
+
+    python benchmarks/http_client.py --requests 2000 --concurrency 10
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Awaitable, Callable, List
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from utils.http import HTTPClient  # noqa: E402
+
+PAYLOAD = {"id": "COMPSCI161", "description": "x" * 512, "terms": ["2022 Fall"] * 10}
+
+
+async def stub_handler(request: web.Request) -> web.Response:
+    return web.json_response(PAYLOAD)
+
+
+async def start_stub_server(port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/rest/v0/courses/{course_id}", stub_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def run(
+    fetch: Callable[[str], Awaitable[object]], url: str, total: int, concurrency: int
+) -> List[float]:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await fetch(url)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    return latencies
+
+
+def report(name: str, latencies: List[float], elapsed: float) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:<22} {len(latencies) / elapsed:>10.1f} req/s"
+        f"   p50 {quantiles[49] * 1000:>7.2f} ms"
+        f"   p99 {quantiles[98] * 1000:>7.2f} ms"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    runner = await start_stub_server(args.port)
+    url = f"http://127.0.0.1:{args.port}/rest/v0/courses/COMPSCI161"
+
+    async def session_per_request(url: str):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as resp:
+                return await resp.json()
+
+    client = HTTPClient()
+    try:
+        for name, fetch in (
+            ("session per request", session_per_request),
+            ("shared HTTPClient", client.get_json),
+        ):
+            start = time.perf_counter()
+            latencies = await run(fetch, url, args.requests, args.concurrency)
+            report(name, latencies, time.perf_counter() - start)
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,187 @@
+"""
+Fault-injection harness for utils.scheduler.RequestScheduler against a fake PeterPortal.
+
+A local fake API adds latency, throttles clients above its rate limit with 429s,
+fails a share of requests with 503s and goes down entirely for an outage
+window. Interactive lookups and a background poller hit it at the same time,
+once through a bare HTTPClient and once through the scheduler, both behind a
+TTLCache that falls back to expired entries. Run from the repository root:
+
+    python benchmarks/peterportal_scheduler.py --duration 10 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Deque, List
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from utils.cache import TTLCache  # noqa: E402
+from utils.http import HTTPClient  # noqa: E402
+from utils.scheduler import BACKGROUND, INTERACTIVE, RequestScheduler  # noqa: E402
+
+FAILURES = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class FakePeterPortal:
+    """Fake SOC endpoint with injected latency, throttling, errors and an outage"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.started = time.monotonic()
+        self.window: Deque[float] = deque()
+        self.statuses: Counter = Counter()
+        self.peak_rate = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        args = self.args
+        now = time.monotonic()
+        self.window.append(now)
+        while self.window[0] <= now - 1:
+            self.window.popleft()
+        self.peak_rate = max(self.peak_rate, len(self.window))
+        await asyncio.sleep(random.uniform(args.min_latency, args.max_latency))
+
+        elapsed = now - self.started
+        if args.outage_start <= elapsed < args.outage_start + args.outage:
+            status = 503
+        elif len(self.window) > args.server_limit:
+            status = 429
+        elif random.random() < args.error_rate:
+            status = 503
+        else:
+            status = 200
+        self.statuses[status] += 1
+        if status == 429:
+            return web.json_response({}, status=429, headers={"Retry-After": "1"})
+        if status != 200:
+            return web.json_response({}, status=status)
+        return web.json_response({"schools": [], "key": request.query.get("key")})
+
+
+async def scenario(
+    name: str,
+    get_json: Callable[[str, dict, int], Awaitable[Any]],
+    url: str,
+    args: argparse.Namespace,
+) -> None:
+    server = FakePeterPortal(args)
+    app = web.Application()
+    app.router.add_get("/soc", server.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", args.port).start()
+
+    cache = TTLCache(maxsize=1024, ttl=args.cache_ttl, fallback_on=FAILURES)
+    latencies = {INTERACTIVE: [], BACKGROUND: []}
+    errors = Counter()
+    deadline = time.monotonic() + args.duration
+
+    async def lookup(key: str, priority: int) -> None:
+        start = time.perf_counter()
+        try:
+            await cache.get_or_fetch(
+                (key, priority), lambda: get_json(url, {"key": key}, priority)
+            )
+        except FAILURES:
+            errors[priority] += 1
+        else:
+            latencies[priority].append(time.perf_counter() - start)
+
+    async def user() -> None:
+        while time.monotonic() < deadline:
+            await lookup(f"dept{random.randrange(args.keys)}", INTERACTIVE)
+            await asyncio.sleep(random.expovariate(1 / args.think_time))
+
+    async def poller() -> None:
+        while time.monotonic() < deadline:
+            await asyncio.gather(
+                *(lookup(f"section{i}", BACKGROUND) for i in range(args.poll_batch))
+            )
+            await asyncio.sleep(1)
+
+    try:
+        await asyncio.gather(poller(), *(user() for _ in range(args.users)))
+    finally:
+        await runner.cleanup()
+
+    print(f"{name}")
+    print(
+        f"  server: peak {server.peak_rate} req/s, "
+        + ", ".join(f"{n}x{s}" for s, n in sorted(server.statuses.items()))
+    )
+    print(f"  cache: {cache.hits} hits, {cache.fallback_hits} served expired")
+    for priority, label in ((INTERACTIVE, "interactive"), (BACKGROUND, "background")):
+        done: List[float] = latencies[priority]
+        if len(done) < 2:
+            print(f"  {label:<11} {len(done)} ok, {errors[priority]} failed")
+            continue
+        quantiles = statistics.quantiles(done, n=100)
+        print(
+            f"  {label:<11} {len(done):>5} ok {errors[priority]:>5} failed"
+            f"   p50 {quantiles[49] * 1000:>8.1f} ms"
+            f"   p99 {quantiles[98] * 1000:>8.1f} ms"
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    url = f"http://127.0.0.1:{args.port}/soc"
+    client = HTTPClient()
+    try:
+        await scenario(
+            "bare HTTPClient",
+            lambda url, params, _: client.get_json(url, params=params),
+            url,
+            args,
+        )
+        scheduler = RequestScheduler(
+            client,
+            rate=args.rate,
+            burst=args.burst,
+            base_delay=0.2,
+            max_delay=2.0,
+            reset_timeout=args.reset_timeout,
+        )
+        await scenario(
+            "RequestScheduler",
+            lambda url, params, priority: scheduler.get_json(url, params, priority),
+            url,
+            args,
+        )
+        print(
+            f"  scheduler: {scheduler.requests} sent, {scheduler.retried} retried, "
+            f"{scheduler.failed} gave up, {scheduler.rejected} rejected by the "
+            f"circuit, {scheduler.coalesced} coalesced"
+        )
+    finally:
+        await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--keys", type=int, default=200)
+    parser.add_argument("--poll-batch", type=int, default=15)
+    parser.add_argument("--cache-ttl", type=float, default=2.0)
+    parser.add_argument("--min-latency", type=float, default=0.02)
+    parser.add_argument("--max-latency", type=float, default=0.15)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--server-limit", type=int, default=30)
+    parser.add_argument("--outage-start", type=float, default=4.0)
+    parser.add_argument("--outage", type=float, default=3.0)
+    parser.add_argument("--rate", type=float, default=25.0)
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--reset-timeout", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8766)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+"""
+Time taken to answer filtered SOC searches from a local SectionIndex, against
+building the index from a department listing.
+
+Needs no network, the listing is generated. Run from the repository root:
+
+    python benchmarks/soc_index.py --courses 300 --sections 6
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from utils.soc_index import SectionIndex, local_scope  # noqa: E402
+
+DAY_PATTERNS = ("MWF", "TuTh", "MW", "M", "W", "F", "TBA")
+TIMES = (" 8:00- 8:50", "10:00-10:50", "11:00-12:20p", " 2:00- 3:20p", " 5:00- 6:50p")
+BUILDINGS = ("EH", "SSL", "DBH", "ICS", "HSLH")
+INSTRUCTORS = ("PATTIS, R.", "THORNTON, A.", "KLEFSTAD, R.", "STAFF", "HOLTON, D.")
+QUERIES = (
+    {"department": "COMPSCI", "days": "TuTh"},
+    {"department": "COMPSCI", "startTime": "1:00PM"},
+    {"department": "COMPSCI", "startTime": "9:00AM", "endTime": "1:00PM"},
+    {"department": "COMPSCI", "building": "EH", "days": "MWF"},
+    {"department": "COMPSCI", "instructorName": "Pattis", "sectionType": "LEC"},
+    {"department": "COMPSCI", "units": "4", "division": "UpperDiv"},
+)
+
+
+def listing(courses: int, sections: int) -> dict:
+    rng = random.Random(0)
+    return {
+        "schools": [
+            {
+                "departments": [
+                    {
+                        "courses": [
+                            {
+                                "deptCode": "COMPSCI",
+                                "courseNumber": str(rng.randint(1, 299)),
+                                "courseTitle": f"COURSE {i}",
+                                "courseComment": "",
+                                "prerequisiteLink": "",
+                                "sections": [
+                                    {
+                                        "sectionCode": str(10000 + i * sections + j),
+                                        "sectionType": rng.choice(
+                                            ("LEC", "DIS", "LAB")
+                                        ),
+                                        "units": rng.choice(("4", "2", "0", "1-4")),
+                                        "instructors": [rng.choice(INSTRUCTORS)],
+                                        "meetings": [
+                                            {
+                                                "days": rng.choice(DAY_PATTERNS),
+                                                "time": rng.choice(TIMES),
+                                                "bldg": f"{rng.choice(BUILDINGS)} 100",
+                                            }
+                                        ],
+                                    }
+                                    for j in range(sections)
+                                ],
+                            }
+                            for i in range(courses)
+                        ]
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    payload = listing(args.courses, args.sections)
+    start = time.perf_counter()
+    index = SectionIndex(payload)
+    print(
+        f"built index of {len(index)} sections in "
+        f"{(time.perf_counter() - start) * 1000:.2f} ms"
+    )
+    for query in QUERIES:
+        params = {"term": "2022 Fall", **query}
+        assert local_scope(params) is not None
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            courses = list(index.search(params))
+        elapsed = (time.perf_counter() - start) / args.repeat
+        sections = sum(len(course["sections"]) for course in courses)
+        flags = " ".join(f"--{k} {v}" for k, v in query.items())
+        print(f"{elapsed * 1e6:>8.1f} us  {sections:>5} sections  {flags}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--courses", type=int, default=300)
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=1000)
+    main(parser.parse_args())
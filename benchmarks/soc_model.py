@@ -0,0 +1,159 @@
+"""
+Allocations made turning a large SOC department response into Course objects,
+with the old eager setattr model against the slotted model and lazy parser.
+
+Needs no network. The response is generated in the shape PeterPortal returns
+for a large department. Run from the repository root:
+
+    python benchmarks/soc_model.py --courses 400 --sections 8
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from itertools import islice
+from typing import Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from cogs.schedule import parse_courses  # noqa: E402
+from utils.soc_index import iter_courses  # noqa: E402
+
+PAGES = 10
+
+
+class LegacyCourse:
+    """Course model before slots, every JSON key set as an attribute"""
+
+    def __init__(self, **kwargs) -> None:
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+        self.sections = []
+        try:
+            for sec in kwargs["sections"]:
+                self.sections.append(LegacySection(**sec))
+        except Exception:
+            pass
+
+
+class LegacySection(LegacyCourse):
+    def __init__(self, **kwargs) -> None:
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+
+
+def legacy_parse(payload: dict) -> list:
+    return_list = []
+    for school in payload["schools"]:
+        for dept in school["departments"]:
+            for course in dept["courses"]:
+                return_list.append(
+                    LegacyCourse(
+                        id=course["deptCode"] + course["courseNumber"],
+                        department=course["deptCode"],
+                        number=course["courseNumber"],
+                        title=course["courseTitle"],
+                        courseComment=course["courseComment"],
+                        prerequisiteURL=course["prerequisiteLink"],
+                        sections=course["sections"],
+                    )
+                )
+    return return_list[:PAGES]
+
+
+def lazy_parse(payload: dict) -> list:
+    courses = list(islice(parse_courses(iter_courses(payload)), PAGES))
+    # What a results page touches
+    for course in courses:
+        course.sections
+    return courses
+
+
+def lazy_parse_all(payload: dict) -> list:
+    courses = list(parse_courses(iter_courses(payload)))
+    for course in courses:
+        course.sections
+    return courses
+
+
+def response(courses: int, sections: int) -> dict:
+    rng = random.Random(0)
+
+    def section(code: int) -> dict:
+        return {
+            "sectionCode": str(code),
+            "sectionType": rng.choice(("Lec", "Dis", "Lab")),
+            "sectionNum": "A1",
+            "units": "4",
+            "instructors": ["PATTIS, R.", "STAFF"],
+            "meetings": [{"days": "MWF", "time": "10:00-10:50", "bldg": "SSL 270"}],
+            "finalExam": "Mon, Dec 5, 10:30-12:30pm",
+            "maxCapacity": "300",
+            "numCurrentlyEnrolled": {"totalEnrolled": "280", "sectionEnrolled": ""},
+            "numOnWaitlist": "12",
+            "numRequested": "400",
+            "numNewOnlyReserved": "0",
+            "restrictions": "A and L",
+            "status": rng.choice(("OPEN", "FULL", "Waitl")),
+            "sectionComment": "",
+        }
+
+    return {
+        "schools": [
+            {
+                "schoolName": "Donald Bren School of ICS",
+                "departments": [
+                    {
+                        "deptName": "Computer Science",
+                        "deptCode": "COMPSCI",
+                        "courses": [
+                            {
+                                "deptCode": "COMPSCI",
+                                "courseNumber": str(100 + i),
+                                "courseTitle": f"COURSE {i}",
+                                "courseComment": "",
+                                "prerequisiteLink": "",
+                                "sections": [
+                                    section(10000 + i * sections + j)
+                                    for j in range(sections)
+                                ],
+                            }
+                            for i in range(courses)
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+def measure(parse: Callable[[dict], list], payload: dict) -> str:
+    tracemalloc.start()
+    start = time.perf_counter()
+    courses = parse(payload)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del courses
+    return f"peak {peak / 1024:>9.1f} KiB   retained {retained / 1024:>8.1f} KiB   {elapsed * 1000:>7.2f} ms"
+
+
+def main(args: argparse.Namespace) -> None:
+    payload = response(args.courses, args.sections)
+    print(f"{args.courses} courses x {args.sections} sections, {PAGES} shown")
+    for name, parse in (
+        ("setattr, eager", legacy_parse),
+        ("slotted, lazy", lazy_parse),
+        ("slotted, all courses", lazy_parse_all),
+    ):
+        print(f"{name:<22} {measure(parse, payload)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--courses", type=int, default=400)
+    parser.add_argument("--sections", type=int, default=8)
+    main(parser.parse_args())
@@ -0,0 +1,117 @@
+"""
+Benchmark of per-row user_logs inserts (writers.insert_user_message) against the
+batched write-behind path (database.buffers.UserLogBuffer).
+
+Needs a Postgres loaded with postgres/sql/create_tables.sql, configured with the
+same POSTGRES_* environment variables as the bot. Run from the repository root:
+
+    python benchmarks/user_logs.py --rows 20000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import asyncpg
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bot"))
+
+from database import writers  # noqa: E402
+from database.buffers import UserLogBuffer  # noqa: E402
+from database.cache import GuildMembership  # noqa: E402
+
+GUILD_ID = 1
+CHANNEL_ID = 2
+USER_ID = 3
+
+
+async def per_row(bot, rows: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await writers.insert_user_message(
+                bot,
+                GUILD_ID,
+                CHANNEL_ID,
+                USER_ID,
+                i,
+                "benchmark message",
+                "Original",
+                datetime.utcnow(),
+            )
+
+    await asyncio.gather(*(one(i) for i in range(rows)))
+
+
+async def buffered(bot, rows: int, concurrency: int) -> str:
+    bot.user_log_buffer = UserLogBuffer(bot)
+    bot.user_log_buffer.start()
+    for i in range(rows):
+        await writers.queue_user_message(
+            bot,
+            GUILD_ID,
+            CHANNEL_ID,
+            USER_ID,
+            i,
+            "benchmark message",
+            "Original",
+            datetime.utcnow(),
+        )
+    await bot.user_log_buffer.close()
+    buffer = bot.user_log_buffer
+    return (
+        f"{buffer.flushes} flushes, "
+        f"avg {buffer.total_flush_seconds / buffer.flushes * 1000:.2f} ms per flush"
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    pool = await asyncpg.create_pool(
+        user=os.environ.get("POSTGRES_USER", "peter"),
+        password=os.environ.get("POSTGRES_PASSWORD"),
+        host=os.environ.get("POSTGRES_HOST", "127.0.0.1"),
+        port=os.environ.get("POSTGRES_PORT", "5432"),
+        database=os.environ.get("POSTGRES_DB", "peterbot"),
+    )
+    bot = SimpleNamespace(
+        db_pool=pool,
+        instance_id="benchmark",
+        peter_users=GuildMembership(),
+        peter_channels=GuildMembership(),
+    )
+    async with pool.acquire() as conn:
+        await conn.execute(
+            "INSERT INTO guilds VALUES ($1, false) ON CONFLICT DO NOTHING", GUILD_ID
+        )
+        await conn.execute(
+            "INSERT INTO users VALUES ($1, $2) ON CONFLICT DO NOTHING",
+            USER_ID,
+            GUILD_ID,
+        )
+        await conn.execute(
+            "INSERT INTO channels VALUES ($1, $2) ON CONFLICT DO NOTHING",
+            CHANNEL_ID,
+            GUILD_ID,
+        )
+    try:
+        for name, run in (("per-row insert", per_row), ("buffered COPY", buffered)):
+            start = time.perf_counter()
+            note = await run(bot, args.rows, args.concurrency)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<22} {args.rows / elapsed:>10.1f} rows/s   {note or ''}")
+    finally:
+        async with pool.acquire() as conn:
+            await conn.execute("DELETE FROM user_logs WHERE guild_id = $1", GUILD_ID)
+        await pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -1,42 +1,174 @@
-from typing import List
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set, Union
 
 import discord
 from discord.ext import commands
+from utils.cache import TTLCache
+
+PageProvider = Union[
+    List[discord.Embed],
+    Callable[[int], Awaitable[discord.Embed]],
+    AsyncIterator[discord.Embed],
+]
 
 
 class PageTurnView(discord.ui.View):
     """discord.ui.View subclass for page-turn functionality between embeds
+
+    Pages come from a page provider and are rendered only when turned to. The
+    most recently rendered pages are kept, and the page after the one shown is
+    rendered ahead of time.
+
     Parameters
     ----------
-    ctx : discord.ext.commands.Context
-        Discord's command context
-    embed_list: List[discord.Embed]
-        List of embeds to page turn
-    message: discord.Message
+    ctx : discord.ext.commands.Context or discord.Interaction
+        The invoking command's context or interaction, only its author may turn
+        pages
+    pages : PageProvider
+        A list of embeds, an async callable rendering page N, or an async
+        iterator of embeds. Pages produced by an iterator are all kept, since
+        they can't be produced again.
+    message : discord.Message
         The message containing the buttons.
-    timeout: float
+    timeout : float
         (Optional) Float indicating seconds before timeout. (Default=60.0)
+    page_count : int
+        (Optional) Number of pages of an async callable, pages wrap around when
+        known. (Default=None)
+    cache_size : int
+        (Optional) Rendered pages kept for an async callable. (Default=5)
     """
 
     def __init__(
         self,
-        ctx: commands.Context,
-        embed_list: List[discord.Embed],
+        ctx: Union[commands.Context, discord.Interaction],
+        pages: PageProvider,
         message: discord.Message,
         timeout=60.0,
+        page_count: Optional[int] = None,
+        cache_size: int = 5,
     ):
         self.ctx = ctx
-        self.embed_list = embed_list
+        self.author_id = (
+            ctx.author.id if isinstance(ctx, commands.Context) else ctx.user.id
+        )
         self.current_page = 0
         self.message = message
+        self.page_count = page_count
+        self._render: Callable[[int], Awaitable[discord.Embed]]
+        self._produced: List[discord.Embed] = []
+        self._iterator: Optional[AsyncIterator[discord.Embed]] = None
+        self._iterator_lock = asyncio.Lock()
+        # Referenced until done so they aren't collected mid-render
+        self._prefetches: Set[asyncio.Task] = set()
+
+        if isinstance(pages, list):
+            self._produced = pages
+            self.page_count = len(pages)
+            self._render = self._next_produced
+        elif callable(pages):
+            self._render = pages
+        else:
+            self._iterator = pages
+            self._render = self._next_produced
+        self._pages = TTLCache(maxsize=cache_size, ttl=float("inf"))
 
         super().__init__(timeout=timeout)
 
+    @property
+    def embed_list(self) -> List[discord.Embed]:
+        """Pages kept as produced, the whole list when given one"""
+        return self._produced
+
+    async def page(self, page: int) -> Optional[discord.Embed]:
+        """
+        Renders a page, or returns it if it was rendered recently
+
+        Parameters
+        ----------
+        page : int
+            page number, wrapped around when the page count is known
+
+        Returns
+        -------
+        discord.Embed
+            the page, None when past the last page of an iterator
+        """
+        if self.page_count:
+            page %= self.page_count
+        if page < len(self._produced):
+            return self._produced[page]
+        try:
+            return await self._pages.get_or_fetch(page, lambda: self._render(page))
+        except IndexError:
+            return None
+
+    def prefetch(self, page: int) -> None:
+        """Starts rendering a page in the background"""
+        if self.page_count:
+            page %= self.page_count
+        if page < len(self._produced) or page in self._pages:
+            return
+        task = asyncio.ensure_future(self.page(page))
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetch_done)
+
+    def _prefetch_done(self, task: asyncio.Task) -> None:
+        self._prefetches.discard(task)
+        # Failures surface again when the page is turned to
+        if not task.cancelled():
+            task.exception()
+
+    def _cancel_prefetches(self) -> None:
+        for task in self._prefetches:
+            task.cancel()
+
+    async def _next_produced(self, page: int) -> discord.Embed:
+        """Advances the iterator up to a page"""
+        async with self._iterator_lock:
+            while self._iterator is not None and len(self._produced) <= page:
+                try:
+                    self._produced.append(await self._iterator.__anext__())
+                except StopAsyncIteration:
+                    self._iterator = None
+                    self.page_count = len(self._produced)
+            if page >= len(self._produced):
+                raise IndexError(page)
+            return self._produced[page]
+
+    async def _turn(self, interaction: discord.Interaction, step: int) -> None:
+        page = self.current_page + step
+        if self.page_count:
+            page %= self.page_count
+        elif page < 0:
+            page = 0
+        self.current_page = page
+
+        cached = page < len(self._produced) or page in self._pages
+        if not cached:
+            # Rendering may outlast the 3 seconds Discord allows to respond
+            await interaction.response.defer()
+        embed = await self.page(page)
+        if embed is None:
+            # Walked past the last page, wrap around now that the count is known
+            if not self.page_count:
+                self.page_count = max(page, 1)
+            self.current_page = page = page % self.page_count
+            embed = await self.page(page)
+        if self.current_page != page or self.is_finished():
+            return
+        if cached:
+            await interaction.response.edit_message(content="", embed=embed)
+        else:
+            await self.message.edit(content="", embed=embed)
+        self.prefetch(page + 1)
+
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
-        return interaction.user.id == self.ctx.message.author.id
+        return interaction.user.id == self.author_id
 
     # Remove buttons on timeout
     async def on_timeout(self) -> None:
+        self._cancel_prefetches()
         super().clear_items()
         try:
             await self.message.edit(view=self)
@@ -50,6 +182,7 @@ class PageTurnView(discord.ui.View):
     async def delete_callback(self, interaction: discord.Interaction, _):
         await interaction.message.delete()
         # Post delete cleanup
+        self._cancel_prefetches()
         super().clear_items()
         super().stop()
 
@@ -57,11 +190,7 @@ class PageTurnView(discord.ui.View):
     @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.gray)
     async def prev_callback(self, interaction: discord.Interaction, _):
         try:
-            self.current_page -= 1
-            await interaction.response.edit_message(
-                content="",
-                embed=self.embed_list[self.current_page % len(self.embed_list)],
-            )
+            await self._turn(interaction, -1)
         except Exception:
             super().clear_items()
             await self.message.edit(view=super())
@@ -71,11 +200,7 @@ class PageTurnView(discord.ui.View):
     @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.gray)
     async def next_callback(self, interaction: discord.Interaction, _):
         try:
-            self.current_page += 1
-            await interaction.response.edit_message(
-                content="",
-                embed=self.embed_list[self.current_page % len(self.embed_list)],
-            )
+            await self._turn(interaction, 1)
         except Exception:
             super().clear_items()
             await self.message.edit(view=super())
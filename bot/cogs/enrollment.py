@@ -0,0 +1,360 @@
+import asyncio
+import logging
+import random
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+import aiohttp
+import discord
+from cogs.schedule import SOC_URL, Section, normalize_term, parse_courses
+from database import loaders, readers, writers
+from discord import app_commands
+from discord.ext import commands, tasks
+from utils.scheduler import BACKGROUND, INTERACTIVE
+from utils.soc_index import iter_courses
+
+if TYPE_CHECKING:
+    from peterbot import PeterBot
+
+# (status, enrolled, waitlist, capacity)
+Snapshot = Tuple[str, str, str, str]
+SNAPSHOT_FIELDS = ("Status", "Enrolled", "Waitlist", "Capacity")
+
+log = logging.getLogger(__name__)
+
+
+def snapshot(section: Section) -> Snapshot:
+    """The enrollment fields of a section that subscribers are told about"""
+    return (
+        section.status,
+        str(section.numCurrentlyEnrolled.get("totalEnrolled", "")),
+        str(section.numOnWaitlist),
+        str(section.maxCapacity),
+    )
+
+
+class WatchedSection:
+    """Polling state of one watched section, shared by all its subscribers
+
+    Sections poll every `min_interval` seconds while they keep changing and back
+    off towards `max_interval` while they don't.
+    """
+
+    __slots__ = (
+        "term",
+        "code",
+        "subscribers",
+        "title",
+        "snapshot",
+        "interval",
+        "next_poll",
+    )
+
+    def __init__(self, term: str, code: str, interval: float):
+        self.term = term
+        self.code = code
+        self.subscribers: Set[int] = set()
+        self.title = code
+        self.snapshot: Optional[Snapshot] = None
+        self.interval = interval
+        self.next_poll = 0.0
+
+
+class Enrollment(commands.Cog):
+    """Section enrollment watches
+
+    Users subscribe to section codes and are DMed when a section's status,
+    enrollment, waitlist or capacity changes. A single poller serves every
+    subscriber: each section is polled once no matter how many users watch it,
+    and due sections of a term are requested together, `batch_size` codes per
+    SOC request.
+
+    Parameters
+    ----------
+    bot : PeterBot
+        The bot object
+    batch_size : int
+        (Optional) Section codes per SOC request. (Default=20)
+    min_interval : float
+        (Optional) Seconds between polls of a changing section. (Default=60)
+    max_interval : float
+        (Optional) Seconds between polls of a quiet section. (Default=900)
+    max_watches : int
+        (Optional) Sections one user may watch. (Default=25)
+    """
+
+    watch = app_commands.Group(
+        name="watch", description="Get a DM when a section's enrollment changes"
+    )
+
+    def __init__(
+        self,
+        bot: "PeterBot",
+        batch_size: int = 20,
+        min_interval: float = 60.0,
+        max_interval: float = 900.0,
+        max_watches: int = 25,
+    ):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_watches = max_watches
+        self.sections: Dict[Tuple[str, str], WatchedSection] = {}
+        # Bounds SOC requests of one poll
+        self.request_limit = asyncio.Semaphore(2)
+        self.poll_sections.start()
+
+    async def cog_unload(self) -> None:
+        self.poll_sections.cancel()
+
+    @watch.command(name="add")
+    @app_commands.describe(
+        term="term of the section, Ex: 2022 Fall", section_code="WebReg section code"
+    )
+    async def watch_add(
+        self, interaction: discord.Interaction, term: str, section_code: str
+    ):
+        """
+        Get a DM whenever a section's status, enrollment or waitlist changes
+        """
+        term = normalize_term(term)
+        section_code = section_code.strip()
+        if not section_code.isdigit():
+            await interaction.response.send_message(
+                "Section codes are numbers, Ex: 34250", ephemeral=True
+            )
+            return
+        watches = await readers.get_section_watches(self.bot, interaction.user.id)
+        if len(watches) >= self.max_watches:
+            await interaction.response.send_message(
+                f"You can watch at most {self.max_watches} sections", ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            found = await self._fetch(term, [section_code], INTERACTIVE)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            await interaction.followup.send(
+                "PeterPortal is unavailable right now. Please try again later."
+            )
+            return
+        if section_code not in found:
+            await interaction.followup.send(
+                f"Section {section_code} was not found for {term}"
+            )
+            return
+        title, section = found[section_code]
+        if not await writers.insert_section_watch(
+            self.bot, interaction.user.id, term, section_code
+        ):
+            await interaction.followup.send(f"You are already watching {title}")
+            return
+        # Changes from now on are reported, even before the next poll
+        watched = self.sections.get((term, section_code))
+        if watched is None:
+            watched = self.sections[(term, section_code)] = WatchedSection(
+                term, section_code, self.min_interval
+            )
+            watched.title = title
+            watched.snapshot = snapshot(section)
+            self._reschedule(watched, changed=True)
+        watched.subscribers.add(interaction.user.id)
+        await interaction.followup.send(
+            f"Watching {title}: {self._describe(snapshot(section))}"
+        )
+
+    @watch.command(name="remove")
+    @app_commands.describe(
+        term="term of the section, Ex: 2022 Fall", section_code="WebReg section code"
+    )
+    async def watch_remove(
+        self, interaction: discord.Interaction, term: str, section_code: str
+    ):
+        """
+        Stop getting DMs about a section
+        """
+        term = normalize_term(term)
+        section_code = section_code.strip()
+        if await writers.delete_section_watch(
+            self.bot, interaction.user.id, term, section_code
+        ):
+            message = f"Stopped watching {section_code} ({term})"
+        else:
+            message = f"You aren't watching {section_code} ({term})"
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @watch.command(name="list")
+    async def watch_list(self, interaction: discord.Interaction):
+        """
+        List the sections you are watching
+        """
+        watches = await readers.get_section_watches(self.bot, interaction.user.id)
+        if not watches:
+            await interaction.response.send_message(
+                "You aren't watching any sections", ephemeral=True
+            )
+            return
+        lines = []
+        for term, code in watches:
+            section = self.sections.get((term, code))
+            if section is not None and section.snapshot is not None:
+                lines.append(f"{section.title}: {self._describe(section.snapshot)}")
+            else:
+                lines.append(f"{code} ({term})")
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+    @tasks.loop(seconds=15)
+    async def poll_sections(self):
+        # One process per deployment polls when clustered
+        if not self.bot.primary:
+            return
+        try:
+            await self._poll()
+        except Exception:
+            # An exception would end the loop for good, the next tick retries
+            log.exception("enrollment poll failed")
+
+    @poll_sections.before_loop
+    async def before_poll_sections(self):
+        await self.bot.wait_until_ready()
+
+    async def _poll(self) -> None:
+        """Polls every due section, batched per term"""
+        await self._sync_subscriptions()
+
+        now = time.monotonic()
+        due: Dict[str, List[WatchedSection]] = {}
+        for section in self.sections.values():
+            if section.next_poll <= now:
+                due.setdefault(section.term, []).append(section)
+        results = await asyncio.gather(
+            *(
+                self._poll_batch(term, sections[i : i + self.batch_size])
+                for term, sections in due.items()
+                for i in range(0, len(sections), self.batch_size)
+            ),
+            # One failing batch doesn't abandon the others
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                log.error("enrollment poll batch failed", exc_info=result)
+
+    async def _sync_subscriptions(self) -> None:
+        """Picks up watches added or removed since the last poll, from any instance"""
+        watches = await loaders.request_section_watches(self.bot)
+        for key in self.sections.keys() - watches.keys():
+            del self.sections[key]
+        for key, subscribers in watches.items():
+            section = self.sections.get(key)
+            if section is None:
+                section = self.sections[key] = WatchedSection(*key, self.min_interval)
+            section.subscribers = subscribers
+
+    async def _poll_batch(self, term: str, sections: List[WatchedSection]) -> None:
+        try:
+            found = await self._fetch(
+                term, [section.code for section in sections], BACKGROUND
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.warning(
+                "enrollment poll of %d %s sections failed: %r", len(sections), term, e
+            )
+            for section in sections:
+                self._reschedule(section, changed=False)
+            return
+
+        for section in sections:
+            if section.code not in found:
+                # Dropped from the listing, keep checking at the slowest rate
+                self._reschedule(section, changed=False)
+                continue
+            title, current = found[section.code]
+            section.title = title
+            previous, section.snapshot = section.snapshot, snapshot(current)
+            # The first poll after startup only records a baseline
+            changed = previous is not None and previous != section.snapshot
+            if changed:
+                self.bot.run_in_background(
+                    self._notify(section, previous, section.snapshot)
+                )
+            self._reschedule(section, changed)
+
+    def _reschedule(self, section: WatchedSection, changed: bool) -> None:
+        """Polls changing sections sooner, quiet ones later, with jitter"""
+        if changed:
+            section.interval = self.min_interval
+        else:
+            section.interval = min(section.interval * 1.5, self.max_interval)
+        # Jitter keeps sections added together from polling in lockstep forever
+        section.next_poll = time.monotonic() + section.interval * random.uniform(
+            0.8, 1.2
+        )
+
+    async def _fetch(
+        self, term: str, codes: Iterable[str], priority: int
+    ) -> Dict[str, Tuple[str, Section]]:
+        """
+        Requests sections of a term in one SOC request
+
+        Polls are sent as background requests, so commands waiting on
+        PeterPortal are served first.
+
+        Parameters
+        ----------
+        term : str
+            term of the sections
+        codes : Iterable[str]
+            WebReg section codes
+        priority : int
+            INTERACTIVE or BACKGROUND
+
+        Returns
+        -------
+        dict
+            section code -> (title, Section), missing codes weren't listed
+        """
+        params = {"term": term, "sectionCodes": ",".join(codes)}
+        async with self.request_limit:
+            payload = await self.bot.peterportal.get_json(
+                SOC_URL, params=params, priority=priority
+            )
+        found = {}
+        for course in parse_courses(iter_courses(payload)):
+            for section in course.sections:
+                found[section.sectionCode] = (
+                    f"{course.department} {course.number} "
+                    f"{section.sectionType} {section.sectionNum} "
+                    f"({section.sectionCode}, {term})",
+                    section,
+                )
+        return found
+
+    async def _notify(
+        self, section: WatchedSection, previous: Snapshot, current: Snapshot
+    ) -> None:
+        """DMs every subscriber of a section the fields that changed"""
+        embed = discord.Embed(title=section.title, description="Enrollment changed")
+        for name, old, new in zip(SNAPSHOT_FIELDS, previous, current):
+            if old != new:
+                embed.add_field(name=name, value=f"{old or 'n/a'} → {new or 'n/a'}")
+        for user_id in list(section.subscribers):
+            try:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                await user.send(embed=embed)
+            except discord.HTTPException as e:
+                # DMs closed, or the user is gone
+                log.info("failed to DM %s about %s: %s", user_id, section.code, e)
+
+    @staticmethod
+    def _describe(values: Snapshot) -> str:
+        return ", ".join(
+            f"{name.lower()} {value or 'n/a'}"
+            for name, value in zip(SNAPSHOT_FIELDS, values)
+        )
+
+
+async def setup(bot: "PeterBot") -> None:
+    await bot.add_cog(Enrollment(bot))
@@ -1,5 +1,8 @@
+from datetime import datetime
 from typing import TYPE_CHECKING
 
+import discord
+from database.writers import MESSAGE_TYPE
 from discord.ext import commands
 
 if TYPE_CHECKING:
@@ -7,9 +10,57 @@ if TYPE_CHECKING:
 
 
 class OnHandling(commands.Cog):
+    """Event handlers
+
+    Messages in guilds with watch_mode enabled are logged to user_logs. Rows are
+    handed to bot.user_log_buffer without waiting, so event handling is never
+    held up by the database.
+    """
+
     def __init__(self, bot: "PeterBot"):
         self.bot = bot
 
+    def _watched(self, message: discord.Message) -> bool:
+        """Whether a message belongs to a guild in watch_mode, answered from cache"""
+        if message.guild is None or message.author.bot:
+            return False
+        guild = self.bot.peter_guilds.get(message.guild.id)
+        return guild is not None and guild.watch_mode
+
+    def _log(
+        self, message: discord.Message, message_type: MESSAGE_TYPE, date: datetime
+    ) -> None:
+        # user_logs.msg_date is a UTC timestamp without time zone
+        self.bot.user_log_buffer.submit(
+            (
+                message.author.id,
+                message.channel.id,
+                message.guild.id,
+                message.id,
+                message.content,
+                message_type,
+                date.replace(tzinfo=None),
+            )
+        )
+
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        if self._watched(message):
+            self._log(message, "Original", message.created_at)
+
+    @commands.Cog.listener()
+    async def on_message_edit(self, before: discord.Message, after: discord.Message):
+        # Embed resolution also dispatches edits, only log content changes
+        if before.content == after.content or not self._watched(after):
+            return
+        self._log(before, "Edit: before", before.edited_at or before.created_at)
+        self._log(after, "Edit: after", after.edited_at or discord.utils.utcnow())
+
+    @commands.Cog.listener()
+    async def on_message_delete(self, message: discord.Message):
+        if self._watched(message):
+            self._log(message, "Deletion", discord.utils.utcnow())
+
 
-async def setup(bot: PeterBot) -> None:
+async def setup(bot: "PeterBot") -> None:
     await bot.add_cog(OnHandling(bot))
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import discord
+from database import readers, writers
+from discord import app_commands
+from discord.ext import commands, tasks
+
+if TYPE_CHECKING:
+    from peterbot import PeterBot
+
+log = logging.getLogger(__name__)
+
+
+class Retention(commands.Cog):
+    """Enforces per-guild user_logs retention windows
+
+    Once an hour expired monthly partitions are dropped whole, and anything left
+    past a guild's window is deleted in small batches to keep locks short.
+
+    Parameters
+    ----------
+    bot : PeterBot
+        The bot object
+    batch_size : int
+        (Optional) Rows removed per delete statement. (Default=5000)
+    """
+
+    def __init__(self, bot: "PeterBot", batch_size: int = 5000):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.enforce_retention.start()
+
+    async def cog_unload(self) -> None:
+        self.enforce_retention.cancel()
+
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.describe(
+        days="days to keep logged messages, leave empty to keep forever"
+    )
+    async def log_retention(
+        self,
+        interaction: discord.Interaction,
+        days: Optional[app_commands.Range[int, 1, 3650]] = None,
+    ):
+        """
+        Set how long logged messages are kept for this server
+        """
+        await writers.update_log_retention(self.bot, interaction.guild_id, days)
+        if days is None:
+            await interaction.response.send_message("Logged messages are kept forever")
+        else:
+            await interaction.response.send_message(
+                f"Logged messages are kept for {days} days"
+            )
+
+    @tasks.loop(hours=1)
+    async def enforce_retention(self):
+        # One process per deployment is enough when clustered
+        if not self.bot.primary:
+            return
+        try:
+            await self._enforce()
+        except Exception:
+            # An exception would end the loop for good, the next run retries
+            log.exception("retention run failed")
+
+    @enforce_retention.before_loop
+    async def before_enforce_retention(self):
+        await self.bot.wait_until_ready()
+
+    async def _enforce(self) -> None:
+        """Creates upcoming partitions, then removes user_logs past every window"""
+        start = time.perf_counter()
+        await writers.create_user_log_partitions(self.bot)
+
+        now = datetime.utcnow()
+        dropped_rows, dropped = await self._drop_expired_partitions(now)
+        deleted_rows = await self._delete_expired_rows(now)
+
+        if dropped or deleted_rows:
+            log.info(
+                "retention: removed %d user_logs rows "
+                "(%d partitions dropped, %d rows deleted) in %.2fs",
+                dropped_rows + deleted_rows,
+                dropped,
+                deleted_rows,
+                time.perf_counter() - start,
+            )
+
+    async def _drop_expired_partitions(self, now: datetime) -> Tuple[int, int]:
+        """Drops partitions that are past the retention window of every guild in them"""
+        rows = 0
+        dropped = 0
+        for partition, upper in await readers.get_user_log_partitions(self.bot):
+            if upper > now:
+                break
+            # Guilds that still want rows from this month
+            keep = [
+                guild_id
+                for guild_id, guild in self.bot.peter_guilds.items()
+                if guild.log_retention_days is None
+                or upper > now - timedelta(days=guild.log_retention_days)
+            ]
+            if keep and await readers.user_log_partition_has_guilds(
+                self.bot, partition, keep
+            ):
+                continue
+            rows += await writers.drop_user_log_partition(self.bot, partition)
+            dropped += 1
+        return rows, dropped
+
+    async def _delete_expired_rows(self, now: datetime) -> int:
+        """Deletes rows past each guild's window in small batches"""
+        rows = 0
+        for guild_id, guild in list(self.bot.peter_guilds.items()):
+            if guild.log_retention_days is None:
+                continue
+            cutoff = now - timedelta(days=guild.log_retention_days)
+            while True:
+                deleted = await writers.delete_user_logs_before(
+                    self.bot, guild_id, cutoff, self.batch_size
+                )
+                rows += deleted
+                if deleted < self.batch_size:
+                    break
+                # Let other work (and other transactions) in between batches
+                await asyncio.sleep(0.1)
+        return rows
+
+
+async def setup(bot: "PeterBot") -> None:
+    await bot.add_cog(Retention(bot))
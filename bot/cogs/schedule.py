@@ -1,14 +1,37 @@
-import shlex
-from typing import TYPE_CHECKING, List
+import asyncio
+import os
+from datetime import date
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlencode
 
 import aiohttp
 import discord
 from cogs.custom_ui.page_turn_embed import PageTurnView
+from database import writers
+from database.cache import normalize_alias
+from discord import app_commands
 from discord.ext import commands
+from utils.scheduler import INTERACTIVE
+from utils.soc_index import QUARTERS, iter_courses, local_scope
 
 if TYPE_CHECKING:
     from peterbot import PeterBot
 
+SOC_URL = "https://api.peterportal.org/rest/v0/schedule/soc"
+
 
 class Schedule(commands.Cog):
     """Handler for associated UCI Schedule commands
@@ -20,11 +43,16 @@ class Schedule(commands.Cog):
 
     Commands
     ----------
-    soc : Searches PeterPortal API for SOC
+    soc : Searches PeterPortal API for SOC, as a prefix and a slash command
+    department_alias : Names a department for this server's --department flags
     """
 
     def __init__(self, bot: "PeterBot"):
         self.bot = bot
+        # Bounds concurrent course detail lookups across every soc invocation
+        self.detail_limit = asyncio.Semaphore(
+            int(os.environ.get("SOC_DETAIL_CONCURRENCY", 5))
+        )
 
     @commands.command(
         name="soc",
@@ -35,7 +63,7 @@ class Schedule(commands.Cog):
         description="""
         Flags:
         --ge:               [ANY, GE-1A, GE-3,...]*
-        --department:       Dept. names. Ex: I&C SCI, PSYC*
+        --department:       Dept. names or server aliases. Ex: I&C SCI, PSYC*
         --courseNumber      [32A, 31-33,]*
         --division          [ALL, LowerDiv, UpperDiv, Graduate]
         --sectionCodes      WebReg codes. Ex: 44201*
@@ -58,62 +86,200 @@ class Schedule(commands.Cog):
     async def soc(self, ctx: "commands.Context", *args):
         """Command to search PeterPortal API for SOC"""
 
-        # Parse arg string into term string and flag dict
+        # Parse args into term string and flag dict
         # Ex:
-        #       "2022 Spring --ge GE-4 --department CHEM"
+        #       "2022 Spring --ge GE-4 --department I&C SCI"
         #   becomes
         #       term = "2022 Spring"
-        #       flags = {"ge":"GE-4", "department":"CHEM"}
-        message = await ctx.send("Searching")
-        term = " ".join(args).split("--")[0]
-        flags = shlex.split(" ".join(args[2:]))
-        flags = dict(zip([f.replace("--", "") for f in flags[::2]], flags[1::2]))
+        #       flags = {"ge":"GE-4", "department":"I&C SCI"}
+        term, flags = parse_soc_args(args)
+        error = check_soc_query(term, flags)
+        if error is not None:
+            await ctx.send(f"{error} See `$help soc` on how to structure command.")
+            return
 
-        # Check command for potential errors, like missing mandatory flags
-        if not any(
-            [st in term.lower() for st in ["spring", "summer", "fall", "winter"]]
-        ):
-            await ctx.send("Missing term. See `$help soc` on how to structure command.")
+        message = await ctx.send("Searching")
+        await self._search(ctx, message, term, flags)
+
+    @app_commands.command(name="soc")
+    @app_commands.describe(
+        term="Ex: 2022 Fall",
+        department="department or server alias, Ex: I&C SCI",
+        ge="GE category, Ex: GE-1A",
+        instructor="instructor last name, Ex: Holton",
+        course_number="Ex: 32A",
+        section_code="WebReg section code, Ex: 44201",
+        division="course level",
+        section_type="Ex: LEC, LAB, SEM",
+        days="Ex: MWF, TuTh",
+        start_time="starting at or after, Ex: 1:00PM",
+        end_time="ending at or before, Ex: 2:00PM",
+        building="building code, Ex: EH",
+    )
+    async def soc_slash(
+        self,
+        interaction: discord.Interaction,
+        term: str,
+        department: Optional[str] = None,
+        ge: Optional[str] = None,
+        instructor: Optional[str] = None,
+        course_number: Optional[str] = None,
+        section_code: Optional[str] = None,
+        division: Optional[Literal["LowerDiv", "UpperDiv", "Graduate"]] = None,
+        section_type: Optional[str] = None,
+        days: Optional[str] = None,
+        start_time: Optional[str] = None,
+        end_time: Optional[str] = None,
+        building: Optional[str] = None,
+    ):
+        """
+        Search the UCI Schedule of Classes
+        """
+        flags = {
+            flag: value
+            for flag, value in (
+                ("department", department),
+                ("ge", ge),
+                ("instructorName", instructor),
+                ("courseNumber", course_number),
+                ("sectionCodes", section_code),
+                ("division", division),
+                ("sectionType", section_type),
+                ("days", days),
+                ("startTime", start_time),
+                ("endTime", end_time),
+                ("building", building),
+            )
+            if value
+        }
+        error = check_soc_query(term, flags)
+        if error is not None:
+            await interaction.response.send_message(error, ephemeral=True)
             return
 
-        if not any(
-            f in flags.keys()
-            for f in [
-                "department",
-                "ge",
-                "courseCodes",
-                "sectionCodes",
-                "instructorName",
-            ]
+        # PeterPortal may outlast the 3 seconds Discord allows to respond
+        await interaction.response.defer(thinking=True)
+        message = await interaction.original_response()
+        await self._search(interaction, message, term, flags)
+
+    @soc_slash.autocomplete("term")
+    async def _term_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> List[app_commands.Choice[str]]:
+        return [
+            app_commands.Choice(name=term, value=term)
+            for term in self.bot.soc_completions.complete_term(current, date.today())
+        ]
+
+    @soc_slash.autocomplete("department")
+    async def _department_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> List[app_commands.Choice[str]]:
+        choices = []
+        if interaction.guild_id is not None:
+            for alias, department in self.bot.peter_catalogue_aliases.complete(
+                interaction.guild_id, current
+            ):
+                choices.append(
+                    app_commands.Choice(name=f"{alias} ({department})", value=alias)
+                )
+        for code, name in self.bot.soc_completions.complete_department(
+            current, limit=25 - len(choices)
         ):
-            await ctx.send(
-                "Missing one of: ['department', 'ge', 'courseNumber', 'sectionCodes', 'instructorName']"
+            label = f"{code} · {name}" if name else code
+            choices.append(app_commands.Choice(name=label[:100], value=code))
+        return choices
+
+    @soc_slash.autocomplete("ge")
+    async def _ge_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> List[app_commands.Choice[str]]:
+        return [
+            app_commands.Choice(name=ge, value=ge)
+            for ge in self.bot.soc_completions.complete_ge(current)
+        ]
+
+    @soc_slash.autocomplete("instructor")
+    async def _instructor_autocomplete(
+        self, interaction: discord.Interaction, current: str
+    ) -> List[app_commands.Choice[str]]:
+        return [
+            app_commands.Choice(name=name, value=name)
+            for name in self.bot.soc_completions.complete_instructor(current)
+        ]
+
+    async def _search(
+        self,
+        ctx: Union["commands.Context", discord.Interaction],
+        message: discord.Message,
+        term: str,
+        flags: Dict[str, str],
+    ) -> None:
+        """Runs a soc search and shows the results in a message
+
+        Parameters
+        ----------
+        ctx : commands.Context or discord.Interaction
+            the invoking command, only its author may turn pages
+        message : discord.Message
+            the message results replace
+        term : str
+            Term to search, Ex: 2022 Fall
+        flags : Dict[str, str]
+            SOC search flags
+        """
+        # Server aliases stand in for department names, Ex: --department ics
+        if ctx.guild is not None and "department" in flags:
+            department = self.bot.peter_catalogue_aliases.resolve(
+                ctx.guild.id, flags["department"]
             )
-            return
+            if department is not None:
+                flags["department"] = department
 
-        # Search the PeterPortalAPI
-        search: List["Course"] = await PeterPortalAPI(term=term, **flags)
+        # Search the PeterPortalAPI, cached results are served if it is down
+        try:
+            search: List["Course"] = await PeterPortalAPI(self.bot, term=term, **flags)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            await message.edit(
+                content="PeterPortal is unavailable right now. Please try again later."
+            )
+            return
 
         # Handle 0 results
         if len(search) == 0:
-            await ctx.send(
-                "No results found. Please try again with different search terms."
+            await message.edit(
+                content="No results found. Please try again with different search terms."
             )
+            return
 
         # Handle case where user is looking for a specific section
         embeds: List["discord.Embed"] = []
         if "sectionCodes" in flags.keys():
             c = search[0]
-            await c.detail()
+            # Like _course_embed, the section is shown without course details
+            # if PeterPortal can't provide them
+            try:
+                async with self.detail_limit:
+                    await c.detail(self.bot)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                detailed = False
+            else:
+                detailed = True
             c = c.sections[0]
 
             if c.sectionCode:
                 embeds.append(
                     discord.Embed(
                         title=f"{search[0].id} ({c.sectionCode}) - {c.sectionType}",
-                        description=search[0].description,
+                        description=(
+                            search[0].description if detailed else search[0].title
+                        ),
                     )
                 )
+                if not detailed:
+                    embeds[0].set_footer(
+                        text="Course details are currently unavailable"
+                    )
 
             if c.instructors:
                 embeds[0].add_field(name="Instructors", value="\n".join(c.instructors))
@@ -146,47 +312,174 @@ class Schedule(commands.Cog):
             if c.restrictions:
                 embeds[0].add_field(name="Restrictions", value=c.restrictions)
 
+            view = PageTurnView(ctx, embeds, message)
+
         # Default case
         else:
 
-            # Format the results into discord Embeds
-            if len(search) > 10:
-                search = search[:10]
+            # Pages are rendered, course details included, only when turned to
+            async def render(page: int) -> discord.Embed:
+                embed = await self._course_embed(search[page])
+                footer = f"{page + 1}/{len(search)}"
+                if embed.footer.text:
+                    footer += f" · {embed.footer.text}"
+                return embed.set_footer(text=footer)
 
-            for c in search:
-                await c.detail()
-                embed = discord.Embed(title=c.id, description=c.description)
+            view = PageTurnView(ctx, render, message, page_count=len(search))
 
-                if c.units:
-                    embed.add_field(name="Units", value=str(c.units))
+        # Multiple Page result display
+        await message.edit(content="", embed=await view.page(0), view=view)
+        view.prefetch(1)
+
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.describe(
+        alias="name to accept, any case, Ex: ics",
+        department="department it stands for, Ex: I&C SCI",
+    )
+    async def department_alias(
+        self, interaction: discord.Interaction, alias: str, department: str
+    ):
+        """
+        Let --department accept another name for a department in this server
+        """
+        await writers.insert_catalogue_alias(
+            self.bot, interaction.guild_id, alias, department
+        )
+        await interaction.response.send_message(
+            f"`--department {normalize_alias(alias)}` now searches "
+            f"{department.upper()}"
+        )
 
-                if c.ge_text:
-                    embed.add_field(name="GE", value=c.ge_text)
+    async def _course_embed(self, c: "Course") -> "discord.Embed":
+        """Fetches a course's details and formats them into an embed
 
-                if c.overlap:
-                    embed.add_field(name="Overlap", value=c.overlap)
+        A failed detail lookup does not raise, the embed is built from the
+        SOC data alone instead.
+        """
+        try:
+            async with self.detail_limit:
+                await c.detail(self.bot)
+        except Exception:
+            embed = discord.Embed(title=c.id, description=c.title)
+            embed.set_footer(text="Course details are currently unavailable")
+        else:
+            embed = discord.Embed(title=c.id, description=c.description)
 
-                if len(c.terms) > 10:
-                    c.terms = c.terms[:10]
-                embed.add_field(name="Past Terms", value=", ".join(c.terms))
+            if c.units:
+                embed.add_field(name="Units", value=str(c.units))
 
-                if len(c.sections) > 10:
-                    c.sections = c.sections[:10]
+            if c.ge_text:
+                embed.add_field(name="GE", value=c.ge_text)
 
-                embed.add_field(
-                    name="Sections",
-                    value=", ".join([str(s.sectionCode) for s in c.sections]),
-                )
-                embeds.append(embed)
+            if c.overlap:
+                embed.add_field(name="Overlap", value=c.overlap)
 
-        # Multiple Page result display
-        current_page = 0
-        await message.edit(
-            content="",
-            embed=embeds[current_page % len(embeds)],
-            view=PageTurnView(ctx, embeds, message),
+            if len(c.terms) > 10:
+                c.terms = c.terms[:10]
+            embed.add_field(name="Past Terms", value=", ".join(c.terms))
+
+        if len(c.sections) > 10:
+            c.sections = c.sections[:10]
+
+        embed.add_field(
+            name="Sections",
+            value=", ".join([str(s.sectionCode) for s in c.sections]),
         )
-        return
+        return embed
+
+
+def parse_soc_args(args: Sequence[str]) -> Tuple[str, Dict[str, str]]:
+    """
+    Splits soc arguments into the term and the flags
+
+    A flag's value runs until the next flag, so multi-word values need no
+    quotes, Ex: ('2022', 'Fall', '--department', 'I&C', 'SCI')
+    -> ('2022 Fall', {'department': 'I&C SCI'})
+    """
+    term: List[str] = []
+    flags: Dict[str, List[str]] = {}
+    values = term
+    for arg in args:
+        if arg.startswith("--"):
+            values = flags.setdefault(arg[2:], [])
+        else:
+            values.append(arg)
+    return " ".join(term), {flag: " ".join(v) for flag, v in flags.items()}
+
+
+def check_soc_query(term: str, flags: Mapping[str, str]) -> Optional[str]:
+    """What is wrong with a soc query, None if it can be searched"""
+    if not any(st in term.lower() for st in ["spring", "summer", "fall", "winter"]):
+        return "Missing term."
+    if not any(
+        f in flags.keys()
+        for f in [
+            "department",
+            "ge",
+            "courseCodes",
+            "sectionCodes",
+            "instructorName",
+        ]
+    ):
+        return "Missing one of: ['department', 'ge', 'courseCodes', 'sectionCodes', 'instructorName']."
+    return None
+
+
+_QUARTER_SPELLINGS = {quarter.lower(): quarter for quarter in QUARTERS}
+
+
+def normalize_term(term: str) -> str:
+    """
+    Term as PeterPortal expects it, Ex: ' 2022  fall' -> '2022 Fall',
+    '2024 summer10WK' -> '2024 Summer10wk'
+    """
+    words = term.split()
+    return " ".join(_QUARTER_SPELLINGS.get(word.lower(), word) for word in words)
+
+
+def soc_cache_key(params: Mapping[str, str]) -> str:
+    """Cache key for a SOC query, independent of flag order"""
+    return "soc:" + urlencode(sorted(params.items()))
+
+
+def course_cache_key(course_id: str) -> str:
+    """Cache key for a course catalogue lookup"""
+    return f"course:{course_id}"
+
+
+async def fetch_json(
+    bot: "PeterBot",
+    key: str,
+    url: str,
+    params: Optional[Mapping[str, str]] = None,
+    persist: bool = False,
+    priority: int = INTERACTIVE,
+    endpoint: Optional[str] = None,
+) -> Any:
+    """Requests a PeterPortal endpoint, optionally persisting the response
+
+    Requests go through bot.peterportal, which rate limits and retries them.
+    The database write happens in the background and never delays the caller.
+    """
+    apiResp = await bot.peterportal.get_json(
+        url, params=params, priority=priority, endpoint=endpoint
+    )
+    if persist:
+        bot.run_in_background(writers.upsert_catalogue_cache(bot, key, apiResp))
+    return apiResp
+
+
+async def fetch_listing(
+    bot: "PeterBot", key: str, params: Mapping[str, str], persist: bool = False
+) -> Any:
+    """fetch_json for SOC searches, their departments and instructors feed
+    bot.soc_completions
+    """
+    apiResp = await fetch_json(bot, key, SOC_URL, params, persist=persist)
+    bot.soc_completions.add_listing(params["term"], apiResp)
+    return apiResp
 
 
 class PeterPortalAPI:
@@ -196,9 +489,24 @@ class PeterPortalAPI:
 
     See https://api.peterportal.org/docs/REST-API/schedule/
     for parameter documentation.
+
+    Parameters
+    ----------
+    bot : PeterBot
+        The bot object
+    term : str
+        Term to search, Ex: 2022 Fall
+    **kwargs : str
+        SOC search flags
     """
 
-    def __init__(self, term: str = None, **kwargs: str):
+    def __init__(
+        self,
+        bot: "PeterBot",
+        term: str = None,
+        **kwargs: str,
+    ):
+        self.bot = bot
         self.term = term
         self.kwargs = kwargs
 
@@ -209,103 +517,195 @@ class PeterPortalAPI:
             if self.term is None:
                 raise ValueError("Class term must be specified")
 
-            # Formatting for URL string
-            self.term = self.term.replace(" ", "%20")
-            for key, val in self.kwargs.items():
-                self.kwargs[key] = val.replace(" ", "%20")
-                self.kwargs[key] = val.replace("&", "%26")
-                self.kwargs[key] = val.replace("/", "%2F")
-            parameters = "&" + "&".join(
-                [f"{key}={value}" for key, value in self.kwargs.items()]
-            )
-            url = f"https://api.peterportal.org/rest/v0/schedule/soc?term={self.term}{parameters}"
-
-            # API call to PeterPortal
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as resp:
-                    if resp.status != 200:
-                        raise
-                    apiResp = await resp.json()
-
-            # Creating list of Course() objects from API response
-            returnList = []
-            for school in apiResp["schools"]:
-                for dept in school["departments"]:
-                    for course in dept["courses"]:
-                        returnList.append(
-                            Course(
-                                id=course["deptCode"] + course["courseNumber"],
-                                department=course["deptCode"],
-                                number=course["courseNumber"],
-                                title=course["courseTitle"],
-                                courseComment=course["courseComment"],
-                                prerequisiteURL=course["prerequisiteLink"],
-                                sections=course["sections"],
-                            )
-                        )
-            return returnList
+            # API call to PeterPortal, query string encoding is handled by aiohttp
+            params = {"term": normalize_term(self.term)}
+            params.update((k, v.strip()) for k, v in self.kwargs.items())
+            # Queries a department or GE listing covers are filtered locally, so
+            # variations of a search share one request
+            scope = local_scope(params)
+            if scope is None:
+                key = soc_cache_key(params)
+                apiResp = await self.bot.soc_cache.get_or_fetch(
+                    key, lambda: fetch_listing(self.bot, key, params)
+                )
+                courses = iter_courses(apiResp)
+            else:
+                key = soc_cache_key(scope)
+                # Department listings are persisted so they survive restarts
+                persist = scope.keys() == {"term", "department"}
+                apiResp = await self.bot.soc_cache.get_or_fetch(
+                    key, lambda: fetch_listing(self.bot, key, scope, persist=persist)
+                )
+                courses = self.bot.soc_index.get(key, apiResp).search(params)
+
+            # Sections and course details are only built for pages turned to
+            return list(parse_courses(courses))
 
         return search().__await__()
 
 
+def parse_courses(courses: Iterable[Mapping[str, Any]]) -> Iterator["Course"]:
+    """Lazily builds Course() objects from SOC course dicts"""
+    for course in courses:
+        yield Course(
+            id=course["deptCode"] + course["courseNumber"],
+            department=course["deptCode"],
+            number=course["courseNumber"],
+            title=course["courseTitle"],
+            courseComment=course["courseComment"],
+            prerequisiteURL=course["prerequisiteLink"],
+            sections=course["sections"],
+        )
+
+
 class Course:
     """General UCI Course object.
     See https://api.peterportal.org/REST-API/schedule/ for information the API provides
 
+    Sections are parsed into Section() objects the first time they are accessed.
+
     Methods
     ----------
-    detail() -> None:
+    detail(bot) -> None:
         Calls another PeterPortal API for additional course information.
         See https://api.peterportal.org/REST-API/courses/ for information the API provides.
     """
 
-    def __init__(self, **kwargs) -> None:
-
-        # Set Course() object attributes
-        for k, v in kwargs.items():
-            setattr(self, k, v)
-
-        # Creates list of Section() objects
-        self.sections = []
-        try:
-            for sec in kwargs["sections"]:
-                self.sections.append(Section(**sec))
-        except Exception:
-            pass
+    __slots__ = (
+        "id",
+        "department",
+        "number",
+        "title",
+        "courseComment",
+        "prerequisiteURL",
+        "description",
+        "units",
+        "ge_list",
+        "ge_text",
+        "overlap",
+        "prerequisite_text",
+        "terms",
+        "_raw_sections",
+        "_sections",
+    )
 
-    async def detail(self) -> None:
+    def __init__(
+        self,
+        id: str,
+        department: str,
+        number: str,
+        title: str,
+        courseComment: str = "",
+        prerequisiteURL: str = "",
+        sections: Sequence[Mapping[str, Any]] = (),
+    ) -> None:
+        self.id = id
+        self.department = department
+        self.number = number
+        self.title = title
+        self.courseComment = courseComment
+        self.prerequisiteURL = prerequisiteURL
+        # Filled in by detail()
+        self.description = ""
+        self.units: List[float] = []
+        self.ge_list: List[str] = []
+        self.ge_text = ""
+        self.overlap = ""
+        self.prerequisite_text = ""
+        self.terms: List[str] = []
+        self._raw_sections = sections
+        self._sections: Optional[List[Section]] = None
+
+    @property
+    def sections(self) -> List["Section"]:
+        if self._sections is None:
+            self._sections = [Section(sec) for sec in self._raw_sections]
+            self._raw_sections = ()
+        return self._sections
+
+    @sections.setter
+    def sections(self, sections: List["Section"]) -> None:
+        self._sections = sections
+        self._raw_sections = ()
+
+    async def detail(self, bot: "PeterBot") -> None:
         """Adds additional course details to a Course() object
 
         See https://api.peterportal.org/REST-API/courses/ for information the API provides.
+
+        Parameters
+        ----------
+        bot : PeterBot
+            The bot object, owner of the shared HTTP client
         """
         # API call to PeterPortal
         url = f"https://api.peterportal.org/rest/v0/courses/{self.id}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as resp:
-                if resp.status != 200:
-                    raise
-                apiResp = await resp.json()
+        key = course_cache_key(self.id)
+        apiResp = await bot.course_cache.get_or_fetch(
+            key,
+            lambda: fetch_json(
+                bot, key, url, persist=True, endpoint="/rest/v0/courses/{id}"
+            ),
+        )
 
-        # Add additional attributes to existing Course() object
-        for k, v in apiResp.items():
-            setattr(self, k, v)
+        # Keep only the details the bot uses
+        self.description = apiResp.get("description", "")
+        self.units = apiResp.get("units", [])
+        self.ge_list = apiResp.get("ge_list", [])
+        self.ge_text = apiResp.get("ge_text", "")
+        self.overlap = apiResp.get("overlap", "")
+        self.prerequisite_text = apiResp.get("prerequisite_text", "")
+        self.terms = list(apiResp.get("terms", []))
 
         return
 
 
-class Section(Course):
+class Section:
     """One section of a specific UCI Course.
-    Inherits from Course class, adds additional information specific to a section.
 
     See https://api.peterportal.org/docs/REST-API/schedule/ for information the API provides
     (contained within sections list)
+
+    Parameters
+    ----------
+    data : Mapping[str, Any]
+        the section as listed by the SOC
     """
 
-    def __init__(self, **kwargs) -> None:
+    __slots__ = (
+        "sectionCode",
+        "sectionType",
+        "sectionNum",
+        "units",
+        "instructors",
+        "meetings",
+        "finalExam",
+        "maxCapacity",
+        "numCurrentlyEnrolled",
+        "numOnWaitlist",
+        "numRequested",
+        "restrictions",
+        "status",
+        "sectionComment",
+    )
 
-        # Set Section() object attributes
-        for k, v in kwargs.items():
-            setattr(self, k, v)
+    def __init__(self, data: Mapping[str, Any]) -> None:
+        self.sectionCode: str = data.get("sectionCode", "")
+        self.sectionType: str = data.get("sectionType", "")
+        self.sectionNum: str = data.get("sectionNum", "")
+        self.units: str = data.get("units", "")
+        self.instructors: List[str] = data.get("instructors", [])
+        self.meetings: List[Mapping[str, str]] = data.get("meetings", [])
+        self.finalExam: str = data.get("finalExam", "")
+        self.maxCapacity: str = data.get("maxCapacity", "")
+        self.numCurrentlyEnrolled: Mapping[str, str] = data.get(
+            "numCurrentlyEnrolled", {}
+        )
+        self.numOnWaitlist: str = data.get("numOnWaitlist", "")
+        self.numRequested: str = data.get("numRequested", "")
+        self.restrictions: str = data.get("restrictions", "")
+        self.status: str = data.get("status", "")
+        self.sectionComment: str = data.get("sectionComment", "")
 
 
 async def setup(bot: "PeterBot") -> None:
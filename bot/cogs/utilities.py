@@ -1,8 +1,18 @@
-from typing import TYPE_CHECKING
+import asyncio
+import collections
+import csv
+import gzip
+import io
+import tempfile
+import threading
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Counter, Iterable, Tuple
 
 import discord
+from database import readers
 from discord import app_commands
 from discord.ext import commands
+from utils import metrics, profiler
 
 if TYPE_CHECKING:
     from peterbot import PeterBot
@@ -15,6 +25,8 @@ class Utilities(commands.Cog):
 
     def __init__(self, bot: "PeterBot"):
         self.bot = bot
+        # One profile at a time, samples of two would be mixed up
+        self.profiling = asyncio.Lock()
 
     @app_commands.command()
     @app_commands.describe(snowflake="user snowflake id or a member")
@@ -37,6 +49,200 @@ class Utilities(commands.Cog):
         embed.set_image(url=user.display_avatar)
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command()
+    @app_commands.guild_only()
+    @app_commands.default_permissions(manage_guild=True)
+    @app_commands.describe(member="member whose message logs to export")
+    async def export_logs(
+        self, interaction: discord.Interaction, member: discord.Member
+    ):
+        """
+        Export a member's logged messages as a compressed CSV file
+        """
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        # Rows are streamed from a server-side cursor straight into a compressed
+        # temporary file, the full history is never held in memory
+        rows = 0
+        with tempfile.TemporaryFile() as tmp:
+            with gzip.GzipFile(fileobj=tmp, mode="wb") as gz:
+                with io.TextIOWrapper(gz, encoding="utf-8", newline="") as text:
+                    writer = csv.writer(text)
+                    writer.writerow(
+                        ["message_date", "message_id", "message_type", "message"]
+                    )
+                    async for log in readers.iter_user_logs(
+                        self.bot, interaction.guild_id, member.id
+                    ):
+                        writer.writerow(
+                            [
+                                log["message_date"].isoformat(),
+                                log["message_id"],
+                                log["message_type"],
+                                log["message"],
+                            ]
+                        )
+                        rows += 1
+
+            if rows == 0:
+                await interaction.followup.send(f"No logs found for {member}")
+                return
+            if tmp.tell() > interaction.guild.filesize_limit:
+                await interaction.followup.send(
+                    f"The export for {member} ({rows} messages) is too large to upload"
+                )
+                return
+            tmp.seek(0)
+            await interaction.followup.send(
+                f"{rows} messages logged for {member}",
+                file=discord.File(tmp, filename=f"{member.id}_logs.csv.gz"),
+            )
+
+    @commands.command(name="stats", hidden=True)
+    @commands.is_owner()
+    async def stats(self, ctx: commands.Context):
+        """Latency and cache statistics of this process, also served at /metrics"""
+        embed = discord.Embed(title="Stats", color=2097148)
+        for name, histogram in (
+            ("Commands", metrics.COMMAND_SECONDS),
+            ("Database, connection held", metrics.DB_HELD_SECONDS),
+            ("Database, pool wait", metrics.DB_ACQUIRE_SECONDS),
+            ("HTTP", metrics.HTTP_SECONDS),
+            ("Message log flushes", metrics.USER_LOG_FLUSH_SECONDS),
+            ("Event loop lag", metrics.LOOP_LAG_SECONDS),
+        ):
+            embed.add_field(name=name, value=summarize(histogram), inline=False)
+        buffer = self.bot.user_log_buffer
+        if buffer is not None:
+            embed.add_field(
+                name="Message log buffer",
+                value=f"{buffer.queue_depth} queued, {buffer.rows_written} written, "
+                f"{buffer.rows_failed} failed, {buffer.rows_dropped} dropped",
+                inline=False,
+            )
+        ratios = metrics.REGISTRY.get("peterbot_cache_hit_ratio")
+        if ratios is not None:
+            embed.add_field(
+                name="Cache hit ratio",
+                value="\n".join(
+                    f"{key[0]}: {value:.1%}" for _, key, value in ratios.samples()
+                ),
+                inline=False,
+            )
+        await ctx.send(embed=embed)
+
+    @commands.command(name="profile", hidden=True)
+    @commands.is_owner()
+    async def profile(self, ctx: commands.Context, seconds: float = 10.0):
+        """
+        Samples the event loop's stack for a number of seconds, and uploads the
+        samples as a collapsed-stack file for flamegraph.pl or speedscope
+        """
+        if not 0 < seconds <= 120:
+            await ctx.send("Profile for between 0 and 120 seconds")
+            return
+        if self.profiling.locked():
+            await ctx.send("A profile is already running")
+            return
+        async with self.profiling:
+            await ctx.send(f"Profiling the event loop for {seconds:g}s...")
+            samples = await profiler.profile(threading.get_ident(), seconds)
+        await ctx.send(
+            f"{sum(samples.values())} samples, busiest frames:\n"
+            + busiest(samples.items()),
+            file=collapsed_file(samples.most_common(), "profile"),
+        )
+
+    @commands.command(name="stalls", hidden=True)
+    @commands.is_owner()
+    async def stalls(self, ctx: commands.Context):
+        """
+        Recent times the event loop was blocked, and a collapsed-stack file of
+        where it was blocked since startup
+        """
+        watchdog = self.bot.watchdog
+        if watchdog is None:
+            await ctx.send("The event loop watchdog is disabled")
+            return
+        stalls, stacks = watchdog.snapshot()
+        if not stacks:
+            await ctx.send(
+                f"The event loop hasn't blocked for over {watchdog.threshold:g}s"
+            )
+            return
+        lines = [
+            f"<t:{int(stall.at.timestamp())}:R> {stall.seconds * 1000:.0f} ms in "
+            f"`{profiler.frame_label(frame.name, frame.filename, frame.lineno)}`"
+            for stall in stalls[-10:]
+            for frame in stall.stack[-1:]
+        ]
+        await ctx.send(
+            "\n".join(lines)[:2000],
+            file=collapsed_file(stacks, "stalls"),
+        )
+
+
+def busiest(samples: Iterable[Tuple[str, int]], top: int = 10) -> str:
+    """
+    The innermost frames sampled most often, one per line
+
+    Parameters
+    ----------
+    samples : Iterable[Tuple[str, int]]
+        (collapsed stack, samples) pairs
+    top : int
+        (Optional) Frames listed at most. (Default=10)
+
+    Returns
+    -------
+    str
+        Ex: '41.2% parse_courses (cogs/schedule.py:88)'
+    """
+    leaves: Counter[str] = collections.Counter()
+    for stack, count in samples:
+        leaves[stack.rpartition(";")[2]] += count
+    total = sum(leaves.values()) or 1
+    lines = [
+        f"{count / total:.1%} `{frame}`" for frame, count in leaves.most_common(top)
+    ]
+    # Leaves room for the sample count in a 2000 character message
+    return "\n".join(lines)[:1900]
+
+
+def collapsed_file(stacks: Iterable[Tuple[str, int]], name: str) -> discord.File:
+    """Stacks written to a collapsed-stack attachment, named by the time taken"""
+    text = io.StringIO()
+    profiler.write_collapsed(stacks, text)
+    taken = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return discord.File(
+        io.BytesIO(text.getvalue().encode()), filename=f"{name}-{taken}.collapsed"
+    )
+
+
+def summarize(histogram: metrics.Histogram, top: int = 8) -> str:
+    """
+    The series of a histogram taking the most time in total, one per line
+
+    Parameters
+    ----------
+    histogram : metrics.Histogram
+    top : int
+        (Optional) Series listed at most. (Default=8)
+
+    Returns
+    -------
+    str
+        Ex: 'soc prefix ok: 12x, mean 840.1 ms, p95 2210.0 ms'
+    """
+    series = sorted(histogram.series(), key=lambda s: s[2], reverse=True)
+    lines = [
+        f"{' '.join(key) or 'all'}: {count}x, mean {total / count * 1000:.1f} ms, "
+        f"p95 {histogram.quantile(0.95, key) * 1000:.1f} ms"
+        for key, count, total in series[:top]
+    ]
+    # Embed field values are capped at 1024 characters
+    return "\n".join(lines)[:1024] or "nothing yet"
+
 
 async def setup(bot: "PeterBot") -> None:
     await bot.add_cog(Utilities(bot))
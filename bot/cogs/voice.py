@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import discord
+from discord.ext import commands
+
+if TYPE_CHECKING:
+    from peterbot import PeterBot
+
+log = logging.getLogger(__name__)
+
+
+class VoiceRoles(commands.Cog):
+    """Roles of managed voice channels
+
+    Members are given a managed voice channel's linked role while they are in
+    it, opening its linked text channel to them, and lose it when they leave.
+    Links come from bot.peter_voice_channels, so events never wait on the
+    database.
+
+    Role edits are debounced per member: each voice event only marks the member,
+    and once they have been still for `delay` seconds (or after `max_delay` of
+    hopping between channels) their managed roles are brought in line with the
+    channel they are in. Leaving and rejoining within the window sends nothing
+    at all.
+
+    Parameters
+    ----------
+    bot : PeterBot
+        The bot object
+    delay : float
+        (Optional) Seconds a member must stay put before their roles are edited.
+        (Default=1.0)
+    max_delay : float
+        (Optional) Longest a member's edit is postponed. (Default=5.0)
+    """
+
+    def __init__(self, bot: "PeterBot", delay: float = 1.0, max_delay: float = 5.0):
+        self.bot = bot
+        self.delay = delay
+        self.max_delay = max_delay
+        # (guild_id, member_id) -> (pending edit, time of the first event)
+        self.pending: Dict[Tuple[int, int], Tuple[asyncio.TimerHandle, float]] = {}
+        # Bounds role edits in flight, discord.py queues past its rate limits
+        self.edit_limit = asyncio.Semaphore(5)
+        self.edits = 0
+
+    async def cog_unload(self) -> None:
+        for handle, _ in self.pending.values():
+            handle.cancel()
+        self.pending.clear()
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ):
+        # Mute, deafen and stream updates don't move the member
+        if before.channel == after.channel or member.bot:
+            return
+        links = self.bot.peter_voice_channels
+        if (before.channel is None or links.get(before.channel.id) is None) and (
+            after.channel is None or links.get(after.channel.id) is None
+        ):
+            return
+        self.schedule(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        # Voice changes missed while offline
+        self.reconcile(guild)
+
+    def reconcile(self, guild: discord.Guild) -> None:
+        """Schedules every member in, or holding the role of, a managed channel"""
+        role_ids = set()
+        for link in self.bot.peter_voice_channels.for_guild(guild.id):
+            role_ids.add(link.role_id)
+            channel = guild.get_channel(link.voice_id)
+            if isinstance(channel, discord.VoiceChannel):
+                for member in channel.members:
+                    self.schedule(guild.id, member.id)
+        for role_id in role_ids:
+            role = guild.get_role(role_id)
+            if role is not None:
+                for member in role.members:
+                    self.schedule(guild.id, member.id)
+
+    def schedule(self, guild_id: int, member_id: int) -> None:
+        """(Re)starts the debounce window of a member's role edit"""
+        key = (guild_id, member_id)
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        handle, first = self.pending.get(key, (None, now))
+        if handle is not None:
+            handle.cancel()
+        delay = min(self.delay, max(first + self.max_delay - now, 0))
+        handle = loop.call_later(delay, self._flush, key)
+        self.pending[key] = (handle, first)
+
+    def _flush(self, key: Tuple[int, int]) -> None:
+        del self.pending[key]
+        self.bot.run_in_background(self.sync_member(*key))
+
+    async def sync_member(self, guild_id: int, member_id: int) -> None:
+        """
+        Gives a member the role of the managed channel they are in, and removes
+        the roles of the others
+
+        Parameters
+        ----------
+        guild_id : int
+            snowflake id of the guild
+        member_id : int
+            snowflake id of the member
+        """
+        guild = self.bot.get_guild(guild_id)
+        member = guild.get_member(member_id) if guild is not None else None
+        if member is None or member.bot:
+            return
+        links = self.bot.peter_voice_channels
+        managed = {link.role_id for link in links.for_guild(guild_id)}
+        wanted: Optional[int] = None
+        if member.voice is not None and member.voice.channel is not None:
+            link = links.get(member.voice.channel.id)
+            wanted = link.role_id if link is not None else None
+
+        # Only managed roles are touched, roles granted by others meanwhile stay
+        held = {role.id for role in member.roles}
+        remove = [
+            role for role in member.roles if role.id in managed and role.id != wanted
+        ]
+        add = []
+        if wanted is not None and wanted not in held:
+            role = guild.get_role(wanted)
+            if role is not None:
+                add.append(role)
+        if not add and not remove:
+            return
+
+        async with self.edit_limit:
+            try:
+                if remove:
+                    await member.remove_roles(*remove, reason="Managed voice channel")
+                if add:
+                    await member.add_roles(*add, reason="Managed voice channel")
+            except discord.HTTPException as e:
+                # Missing permissions, or the role is above the bot's
+                log.warning(
+                    "failed to edit voice roles of %s in %s: %s", member_id, guild_id, e
+                )
+            else:
+                self.edits += 1
+
+
+async def setup(bot: "PeterBot") -> None:
+    await bot.add_cog(VoiceRoles(bot))
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple
+
+from asyncpg import Connection
+from database.notifications import apply_cache_change, notify_cache_change
+from utils import metrics
+
+if TYPE_CHECKING:
+    from peterbot import PeterBot
+
+# (user_id, channel_id, guild_id, message_id, msg, msg_type, msg_date)
+UserLogRecord = Tuple[int, int, int, int, str, str, datetime]
+
+USER_LOG_COLUMNS = (
+    "user_id",
+    "channel_id",
+    "guild_id",
+    "message_id",
+    "msg",
+    "msg_type",
+    "msg_date",
+)
+
+log = logging.getLogger(__name__)
+
+
+class UserLogBuffer:
+    """Write-behind buffer for user_logs rows
+
+    Rows are accumulated in memory and written with a single COPY once
+    `max_batch` rows are waiting or `flush_interval` seconds have passed since
+    the first row of the batch arrived.
+
+    Parameters
+    ----------
+    bot : PeterBot
+        The bot object, owner of the database pool
+    max_batch : int
+        (Optional) Rows written per flush. (Default=500)
+    flush_interval : float
+        (Optional) Seconds a row may wait before being flushed. (Default=2.0)
+    max_pending : int
+        (Optional) Rows held in memory before `put` waits for a flush. (Default=10000)
+
+    Attributes
+    ----------
+    rows_written : int
+        Rows successfully flushed
+    rows_failed : int
+        Rows lost to a failed flush
+    rows_dropped : int
+        Rows rejected by `submit` because the buffer was full
+    flushes : int
+        Number of flushes attempted
+    last_flush_seconds : float
+        Duration of the most recent flush
+    total_flush_seconds : float
+        Summed duration of every flush
+    """
+
+    def __init__(
+        self,
+        bot: "PeterBot",
+        max_batch: int = 500,
+        flush_interval: float = 2.0,
+        max_pending: int = 10000,
+    ):
+        self.bot = bot
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self._queue: "asyncio.Queue[Optional[UserLogRecord]]" = asyncio.Queue(
+            maxsize=max_pending
+        )
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def queue_depth(self) -> int:
+        """Rows waiting to be flushed"""
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        """Starts the background flush task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, record: UserLogRecord) -> None:
+        """
+        Queues a row, waiting for room when the buffer is full
+
+        Parameters
+        ----------
+        record : UserLogRecord
+            row values in `USER_LOG_COLUMNS` order
+
+        Returns
+        -------
+        None
+        """
+        if self._closing:
+            raise RuntimeError("UserLogBuffer is closed")
+        await self._queue.put(record)
+
+    def submit(self, record: UserLogRecord) -> bool:
+        """
+        Queues a row without waiting, dropping it when the buffer is full
+
+        Parameters
+        ----------
+        record : UserLogRecord
+            row values in `USER_LOG_COLUMNS` order
+
+        Returns
+        -------
+        bool
+            whether the row was queued
+        """
+        if self._closing:
+            return False
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.rows_dropped += 1
+            return False
+        return True
+
+    async def close(self) -> None:
+        """Stops accepting rows and flushes everything already queued"""
+        if self._closing:
+            return
+        self._closing = True
+        if self._task is None:
+            return
+        # Rows queued before the sentinel are drained and flushed before exiting
+        await self._queue.put(None)
+        await self._task
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            record = await self._queue.get()
+            if record is None:
+                return
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            done = False
+            while len(batch) < self.max_batch:
+                try:
+                    record = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        record = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if record is None:
+                    done = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+            if done:
+                return
+
+    async def _flush(self, batch: List[UserLogRecord]) -> None:
+        start = time.perf_counter()
+        try:
+            users, channels = self._unknown_parents(batch)
+            user_rows = [{"user_id": u, "guild_id": g} for u, g in users]
+            channel_rows = [{"channel_id": c, "guild_id": g} for c, g in channels]
+            async with self.bot.db_pool.acquire() as conn:
+                conn: Connection
+                async with conn.transaction():
+                    # user_logs references users and channels, register unseen ones
+                    if users:
+                        await conn.executemany(
+                            "INSERT INTO users VALUES ($1, $2) ON CONFLICT DO NOTHING",
+                            users,
+                        )
+                    if channels:
+                        await conn.executemany(
+                            "INSERT INTO channels VALUES ($1, $2) "
+                            "ON CONFLICT DO NOTHING",
+                            channels,
+                        )
+                    await conn.copy_records_to_table(
+                        "user_logs", records=batch, columns=USER_LOG_COLUMNS
+                    )
+                    await notify_cache_change(conn, self.bot, "users", user_rows)
+                    await notify_cache_change(conn, self.bot, "channels", channel_rows)
+            apply_cache_change(self.bot, "users", user_rows)
+            apply_cache_change(self.bot, "channels", channel_rows)
+        except Exception as e:
+            self.rows_failed += len(batch)
+            log.error("failed to flush %d user_logs rows: %r", len(batch), e)
+        else:
+            self.rows_written += len(batch)
+        finally:
+            self.flushes += 1
+            self.last_flush_seconds = time.perf_counter() - start
+            self.total_flush_seconds += self.last_flush_seconds
+            metrics.USER_LOG_FLUSH_SECONDS.observe(self.last_flush_seconds)
+
+    def _unknown_parents(
+        self, batch: List[UserLogRecord]
+    ) -> Tuple[Set[Tuple[int, int]], Set[Tuple[int, int]]]:
+        """(user_id, guild_id) and (channel_id, guild_id) pairs missing from the caches"""
+        users = set()
+        channels = set()
+        for user_id, channel_id, guild_id, *_ in batch:
+            if not self.bot.peter_users.contains(guild_id, user_id):
+                users.add((user_id, guild_id))
+            if not self.bot.peter_channels.contains(guild_id, channel_id):
+                channels.add((channel_id, guild_id))
+        return users, channels
@@ -0,0 +1,263 @@
+from typing import (
+    AbstractSet,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+_EMPTY: AbstractSet = frozenset()
+_NO_ALIASES: Mapping[str, str] = {}
+
+
+class GuildConfig:
+    """Cached row of the guilds table
+
+    Parameters
+    ----------
+    guild_id : int
+        snowflake id of the guild
+    watch_mode : bool
+        (Optional) whether messages are logged. (Default=False)
+    log_retention_days : int
+        (Optional) days logs are kept for, None keeps them forever
+    """
+
+    __slots__ = ("guild_id", "watch_mode", "log_retention_days")
+
+    def __init__(
+        self,
+        guild_id: int,
+        watch_mode: bool = False,
+        log_retention_days: Optional[int] = None,
+    ):
+        self.guild_id = guild_id
+        self.watch_mode = watch_mode
+        self.log_retention_days = log_retention_days
+
+    def __repr__(self) -> str:
+        return (
+            f"GuildConfig(guild_id={self.guild_id}, watch_mode={self.watch_mode}, "
+            f"log_retention_days={self.log_retention_days})"
+        )
+
+
+class VoiceChannelLink:
+    """Cached row of the voice_channels table
+
+    Parameters
+    ----------
+    voice_id : int
+        snowflake id of the managed voice channel
+    guild_id : int
+        snowflake id of the guild
+    text_id : int
+        snowflake id of the linked text channel
+    role_id : int
+        snowflake id of the role granted while in the voice channel
+    """
+
+    __slots__ = ("voice_id", "guild_id", "text_id", "role_id")
+
+    def __init__(self, voice_id: int, guild_id: int, text_id: int, role_id: int):
+        self.voice_id = voice_id
+        self.guild_id = guild_id
+        self.text_id = text_id
+        self.role_id = role_id
+
+    def __repr__(self) -> str:
+        return (
+            f"VoiceChannelLink(voice_id={self.voice_id}, guild_id={self.guild_id}, "
+            f"text_id={self.text_id}, role_id={self.role_id})"
+        )
+
+
+class GuildMembership:
+    """Ids registered to each guild, used for the users and channels tables
+
+    Lookups of unknown guilds return an empty set and never create an entry.
+    """
+
+    __slots__ = ("_by_guild",)
+
+    def __init__(self):
+        self._by_guild: Dict[int, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_guild)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._by_guild)
+
+    def add(self, guild_id: int, member_id: int) -> None:
+        members = self._by_guild.get(guild_id)
+        if members is None:
+            members = self._by_guild[guild_id] = set()
+        members.add(member_id)
+
+    def update(self, guild_id: int, member_ids: Iterable[int]) -> None:
+        members = self._by_guild.get(guild_id)
+        if members is None:
+            members = self._by_guild[guild_id] = set()
+        members.update(member_ids)
+
+    def discard(self, guild_id: int, member_id: int) -> None:
+        members = self._by_guild.get(guild_id)
+        if members is not None:
+            members.discard(member_id)
+
+    def contains(self, guild_id: int, member_id: int) -> bool:
+        return member_id in self._by_guild.get(guild_id, _EMPTY)
+
+    def of(self, guild_id: int) -> AbstractSet[int]:
+        """Ids registered to a guild, treat the result as read-only"""
+        return self._by_guild.get(guild_id, _EMPTY)
+
+
+class VoiceChannelIndex:
+    """Managed voice channels, indexed by voice channel
+
+    Only voice state updates look links up, by voice channel. Per-guild
+    listings are rare and scan every link, which is cheaper than holding a
+    reverse index for each.
+    """
+
+    __slots__ = ("_by_voice",)
+
+    def __init__(self):
+        self._by_voice: Dict[int, VoiceChannelLink] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_voice)
+
+    def __iter__(self) -> Iterator[VoiceChannelLink]:
+        return iter(self._by_voice.values())
+
+    def add(self, link: VoiceChannelLink) -> None:
+        self._by_voice[link.voice_id] = link
+
+    def remove(self, voice_id: int) -> None:
+        self._by_voice.pop(voice_id, None)
+
+    def get(self, voice_id: int) -> Optional[VoiceChannelLink]:
+        return self._by_voice.get(voice_id)
+
+    def for_guild(self, guild_id: int) -> List[VoiceChannelLink]:
+        """Links of the voice channels managed in a guild"""
+        return [link for link in self._by_voice.values() if link.guild_id == guild_id]
+
+
+def normalize_alias(alias: str) -> str:
+    """Aliases match case-insensitively, Ex: ' Comp Sci ' -> 'comp sci'"""
+    return " ".join(alias.split()).casefold()
+
+
+class _TrieNode:
+    __slots__ = ("children", "department")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # Set on nodes that end an alias
+        self.department: Optional[str] = None
+
+
+class CatalogueAliasIndex:
+    """Per-guild department aliases, with a reverse index by department
+
+    Aliases are stored normalized, so lookups are case-insensitive dict hits.
+    Each guild also has a prefix trie of its aliases for autocomplete, updated
+    in place as aliases are added.
+    """
+
+    __slots__ = ("_by_guild", "_by_department", "_tries")
+
+    def __init__(self):
+        self._by_guild: Dict[int, Dict[str, str]] = {}
+        self._by_department: Dict[Tuple[int, str], Set[str]] = {}
+        self._tries: Dict[int, _TrieNode] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_guild)
+
+    def add(self, guild_id: int, alias: str, department: str) -> None:
+        alias = normalize_alias(alias)
+        department = department.upper()
+        aliases = self._by_guild.get(guild_id)
+        if aliases is None:
+            aliases = self._by_guild[guild_id] = {}
+        previous = aliases.get(alias)
+        if previous is not None:
+            self._by_department.get((guild_id, previous), set()).discard(alias)
+        aliases[alias] = department
+        names = self._by_department.get((guild_id, department))
+        if names is None:
+            names = self._by_department[(guild_id, department)] = set()
+        names.add(alias)
+
+        node = self._tries.get(guild_id)
+        if node is None:
+            node = self._tries[guild_id] = _TrieNode()
+        for char in alias:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+        node.department = department
+
+    def resolve(self, guild_id: int, alias: str) -> Optional[str]:
+        """The department an alias stands for in a guild, in any case"""
+        return self._by_guild.get(guild_id, _NO_ALIASES).get(normalize_alias(alias))
+
+    def complete(
+        self, guild_id: int, prefix: str, limit: int = 25
+    ) -> List[Tuple[str, str]]:
+        """
+        Aliases of a guild starting with a prefix, for autocomplete
+
+        Parameters
+        ----------
+        guild_id : int
+            snowflake id of the guild
+        prefix : str
+            what has been typed so far, in any case
+        limit : int
+            (Optional) Matches returned at most. (Default=25, Discord's limit)
+
+        Returns
+        -------
+        list
+            (alias, department) pairs, shortest and then alphabetical first
+        """
+        node = self._tries.get(guild_id)
+        for char in normalize_alias(prefix):
+            if node is None:
+                return []
+            node = node.children.get(char)
+        if node is None:
+            return []
+        # Breadth first, so whole words come before longer aliases they start
+        matches: List[Tuple[str, str]] = []
+        level = [(normalize_alias(prefix), node)]
+        while level and len(matches) < limit:
+            below = []
+            for text, node in level:
+                if node.department is not None:
+                    matches.append((text, node.department))
+                    if len(matches) == limit:
+                        break
+                for char in sorted(node.children):
+                    below.append((text + char, node.children[char]))
+            level = below
+        return matches
+
+    def aliases(self, guild_id: int) -> Mapping[str, str]:
+        """Every alias of a guild, treat the result as read-only"""
+        return self._by_guild.get(guild_id, _NO_ALIASES)
+
+    def aliases_for(self, guild_id: int, department: str) -> AbstractSet[str]:
+        """Aliases a guild has for a department, treat the result as read-only"""
+        return self._by_department.get((guild_id, department.upper()), _EMPTY)
@@ -1,13 +1,20 @@
-from collections import defaultdict
-from typing import TYPE_CHECKING, Mapping, Set
+import json
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Set, Tuple
 
 from asyncpg import Connection
+from database.cache import (
+    CatalogueAliasIndex,
+    GuildConfig,
+    GuildMembership,
+    VoiceChannelIndex,
+    VoiceChannelLink,
+)
 
 if TYPE_CHECKING:
     from peterbot import PeterBot
 
 
-async def request_guilds(bot: "PeterBot") -> Mapping[int, Mapping[str, bool]]:
+async def request_guilds(bot: "PeterBot") -> Dict[int, GuildConfig]:
     """
     Builds a dictionary of guild data that the bot exists in
 
@@ -18,26 +25,26 @@ async def request_guilds(bot: "PeterBot") -> Mapping[int, Mapping[str, bool]]:
     Returns
     -------
     dict
-        Dictionary of guild id and its associated data
+        Dictionary of guild id and its cached row
 
         {
-            guild_id : {
-                'watch_mode' : bool
-            }, ...
+            guild_id : GuildConfig, ...
         }
     """
-    results = defaultdict(dict)
+    results = {}
     async with bot.db_pool.acquire() as conn:
         conn: Connection
         query = await conn.prepare("SELECT * FROM guilds")
         for row in await query.fetch():
-            results[row["guild_id"]]["watch_mode"] = row["watch_mode"]
+            results[row["guild_id"]] = GuildConfig(
+                row["guild_id"], row["watch_mode"], row["log_retention_days"]
+            )
     return results
 
 
-async def request_users(bot: "PeterBot") -> Mapping[int, Set[int]]:
+async def request_users(bot: "PeterBot") -> GuildMembership:
     """
-    Builds a dictionary of user data by build
+    Builds the users registered to each guild
 
     Parameters
     ----------
@@ -45,25 +52,21 @@ async def request_users(bot: "PeterBot") -> Mapping[int, Set[int]]:
 
     Returns
     -------
-    dict
-        Dictionary of users registered to a guild
-
-        {
-            guild_id : {user_id_1, user_id_2, ...}, ...
-        }
+    GuildMembership
+        user ids registered to each guild
     """
-    results = defaultdict(set)
+    results = GuildMembership()
     async with bot.db_pool.acquire() as conn:
         conn: Connection
         query = await conn.prepare("SELECT * FROM users")
         for row in await query.fetch():
-            results[row["guild_id"]].add(row["user_id"])
+            results.add(row["guild_id"], row["user_id"])
     return results
 
 
-async def request_catalogue_aliases(bot: "PeterBot") -> Mapping[int, Mapping[str, str]]:
+async def request_catalogue_aliases(bot: "PeterBot") -> CatalogueAliasIndex:
     """
-    Builds a dictionary of catalogue aliases by guild id
+    Builds the catalogue aliases registered to each guild
 
     Parameters
     ----------
@@ -71,54 +74,103 @@ async def request_catalogue_aliases(bot: "PeterBot") -> Mapping[int, Mapping[str
 
     Returns
     -------
-    dict
-        Dictionary of catalogue aliases registered to a guild
-
-        {
-            guild_id : {
-                'alias' : 'department', ...
-            }, ...
-        }
+    CatalogueAliasIndex
+        aliases and the departments they stand for, by guild id
     """
-    results = defaultdict(dict)
+    results = CatalogueAliasIndex()
     async with bot.db_pool.acquire() as conn:
         conn: Connection
         query = await conn.prepare("SELECT * FROM catalogue_alias")
         for row in await query.fetch():
-            results[row["guild_id"]][row["alias"]] = row["department"]
+            results.add(row["guild_id"], row["alias"], row["department"])
+    return results
+
+
+async def request_channels(bot: "PeterBot") -> GuildMembership:
+    """
+    Builds the channels registered to each guild
+
+    Parameters
+    ----------
+    bot : PeterBot
+
+    Returns
+    -------
+    GuildMembership
+        channel ids registered to each guild
+    """
+    results = GuildMembership()
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        query = await conn.prepare("SELECT * FROM channels")
+        for row in await query.fetch():
+            results.add(row["guild_id"], row["channel_id"])
+    return results
+
+
+async def request_voice_channels(bot: "PeterBot") -> VoiceChannelIndex:
+    """
+    Builds the managed voice channels of every guild
+
+    Parameters
+    ----------
+    bot : PeterBot
+
+    Returns
+    -------
+    VoiceChannelIndex
+        managed voice channels, looked up by voice id, text id or guild id
+    """
+    results = VoiceChannelIndex()
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        query = await conn.prepare("SELECT * FROM voice_channels")
+        for row in await query.fetch():
+            results.add(
+                VoiceChannelLink(
+                    row["voice_id"], row["guild_id"], row["text_id"], row["role_id"]
+                )
+            )
     return results
 
 
-async def request_channels(bot: "PeterBot") -> Mapping[int, Set[int]]:
+async def request_catalogue_cache(
+    bot: "PeterBot",
+) -> Mapping[str, Tuple[Any, float]]:
     """
-    Builds a dictionary of channels by guild id
+    Builds a dictionary of persisted PeterPortal responses by cache key
 
     Parameters
     ----------
+    bot : PeterBot
 
     Returns
     -------
     dict
-        Dictionary of channels registered to a guild
+        Dictionary of cached API payloads and their age in seconds
 
         {
-            guild_id : {channel_id_1, channel_id_2, ...}, ...
+            cache_key : (payload, age), ...
         }
     """
-    results = defaultdict(set)
+    results = {}
     async with bot.db_pool.acquire() as conn:
         conn: Connection
-        query = await conn.prepare("SELECT * FROM channels")
+        query = await conn.prepare(
+            "SELECT cache_key, payload, "
+            "EXTRACT(EPOCH FROM (now() AT TIME ZONE 'utc') - fetched_at) AS age "
+            "FROM catalogue_cache"
+        )
         for row in await query.fetch():
-            results[row["guild_id"]].add(row["channel_id"])
+            results[row["cache_key"]] = (json.loads(row["payload"]), float(row["age"]))
     return results
 
 
-async def request_voice_channels(
+async def request_section_watches(
     bot: "PeterBot",
-) -> Mapping[int, Mapping[int, Mapping[str, str]]]:
+) -> Mapping[Tuple[str, str], Set[int]]:
     """
-    Builds a dictionary of managed voice channels by guild id
+    Builds a dictionary of watched sections and the users watching them
 
     Parameters
     ----------
@@ -127,25 +179,20 @@ async def request_voice_channels(
     Returns
     -------
     dict
-        Dictionary of managed voice channels to a guild
+        Dictionary of subscribers by term and section code
 
         {
-            guild_id : {
-                voice_channel_id : {
-                    'text_id' : text_id,
-                    'role_id' : role_id
-                }
-            }
+            (term, section_code) : {user_id_1, user_id_2, ...}, ...
         }
     """
-    results = defaultdict(dict)
+    results = {}
     async with bot.db_pool.acquire() as conn:
         conn: Connection
-        query = await conn.prepare("SELECT * FROM voice_channels")
+        query = await conn.prepare(
+            "SELECT user_id, term, section_code FROM section_watches"
+        )
         for row in await query.fetch():
-            guild_id = row["guild_id"]
-            voice_id = row["voice_id"]
-            results[guild_id] = {}
-            results[guild_id][voice_id]["text_id"] = row["text_id"]
-            results[guild_id][voice_id]["role_id"] = row["role_id"]
+            results.setdefault((row["term"], row["section_code"]), set()).add(
+                row["user_id"]
+            )
     return results
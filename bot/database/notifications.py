@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+)
+
+from asyncpg import Connection, InterfaceError, PostgresError
+from database.cache import GuildConfig, VoiceChannelLink
+
+if TYPE_CHECKING:
+    from peterbot import PeterBot
+
+CACHE_CHANNEL = "peterbot_cache"
+
+# NOTIFY payloads are limited to 8000 bytes, large batches are split below it
+_MAX_NOTIFY_BYTES = 7900
+
+CacheRow = Mapping[str, Any]
+
+log = logging.getLogger(__name__)
+
+
+async def notify_cache_change(
+    conn: Connection, bot: "PeterBot", table: str, rows: List[CacheRow]
+) -> None:
+    """
+    Announces rows written to a cached table to every bot instance
+
+    Call inside the writing transaction, notifications are only delivered once
+    it commits.
+
+    Parameters
+    ----------
+    conn : Connection
+        connection holding the writing transaction
+    bot : PeterBot
+    table : str
+        name of the cached table
+    rows : List[CacheRow]
+        written rows, in the shape `apply_cache_change` expects
+
+    Returns
+    -------
+    None
+    """
+    for payload in _notify_payloads(bot.instance_id, table, rows):
+        await conn.execute("SELECT pg_notify($1, $2)", CACHE_CHANNEL, payload)
+
+
+def _notify_payloads(origin: str, table: str, rows: List[CacheRow]) -> Iterator[str]:
+    """Splits rows into as few payloads as fit under _MAX_NOTIFY_BYTES each"""
+    head = json.dumps({"origin": origin, "table": table}, separators=(",", ":"))
+    # '{"origin":...,"table":...,"rows":[' + rows joined by ',' + ']}'
+    prefix = head[:-1] + ',"rows":['
+    chunk: List[str] = []
+    size = len(prefix.encode()) + 2
+    for row in rows:
+        encoded = json.dumps(row, separators=(",", ":"))
+        row_size = len(encoded.encode()) + (1 if chunk else 0)
+        if chunk and size + row_size > _MAX_NOTIFY_BYTES:
+            yield prefix + ",".join(chunk) + "]}"
+            chunk = []
+            size = len(prefix.encode()) + 2
+            row_size -= 1
+        chunk.append(encoded)
+        size += row_size
+    if chunk:
+        yield prefix + ",".join(chunk) + "]}"
+
+
+def apply_cache_change(bot: "PeterBot", table: str, rows: List[CacheRow]) -> None:
+    """
+    Applies written rows to the bot's in-memory caches
+
+    Applying the same rows twice is harmless.
+
+    Parameters
+    ----------
+    bot : PeterBot
+    table : str
+        name of the cached table
+    rows : List[CacheRow]
+        written rows
+
+    Returns
+    -------
+    None
+    """
+    if table == "guilds":
+        for row in rows:
+            guild = bot.peter_guilds.get(row["guild_id"])
+            if guild is None:
+                guild = bot.peter_guilds[row["guild_id"]] = GuildConfig(row["guild_id"])
+            for key, value in row.items():
+                setattr(guild, key, value)
+    elif table == "users":
+        for row in rows:
+            bot.peter_users.add(row["guild_id"], row["user_id"])
+    elif table == "channels":
+        for row in rows:
+            bot.peter_channels.add(row["guild_id"], row["channel_id"])
+    elif table == "voice_channels":
+        for row in rows:
+            bot.peter_voice_channels.add(
+                VoiceChannelLink(
+                    row["voice_id"], row["guild_id"], row["text_id"], row["role_id"]
+                )
+            )
+    elif table == "catalogue_alias":
+        for row in rows:
+            bot.peter_catalogue_aliases.add(
+                row["guild_id"], row["alias"], row["department"]
+            )
+
+
+class CacheListener:
+    """Keeps the bot's caches in step with writes made by other instances
+
+    Holds a dedicated connection that LISTENs on `CACHE_CHANNEL` and applies each
+    change to the local caches. Changes that arrive before the caches are loaded
+    are held until `mark_ready`. If the connection drops it is re-established and
+    the caches are reloaded, since changes may have been missed meanwhile.
+
+    Parameters
+    ----------
+    bot : PeterBot
+        The bot object
+    connect : Callable[[], Awaitable[Connection]]
+        Opens the dedicated listening connection
+    reload : Callable[[], Awaitable[None]]
+        Reloads every cache from the database
+    """
+
+    def __init__(
+        self,
+        bot: "PeterBot",
+        connect: Callable[[], Awaitable[Connection]],
+        reload: Callable[[], Awaitable[None]],
+    ):
+        self.bot = bot
+        self._connect = connect
+        self._reload = reload
+        self._conn: Optional[Connection] = None
+        self._pending: Optional[List[Mapping[str, Any]]] = []
+        self._closing = False
+        self._reconnect_task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Opens the listening connection"""
+        conn = await self._connect()
+        try:
+            await conn.add_listener(CACHE_CHANNEL, self._on_notify)
+        except BaseException:
+            conn.terminate()
+            raise
+        conn.add_termination_listener(self._on_terminate)
+        self._conn = conn
+
+    def mark_ready(self) -> None:
+        """Applies changes held while the caches were loading, then applies live"""
+        pending, self._pending = self._pending, None
+        for change in pending or ():
+            apply_cache_change(self.bot, change["table"], change["rows"])
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+
+    def _on_notify(
+        self, conn: Connection, pid: int, channel: str, payload: str
+    ) -> None:
+        change = json.loads(payload)
+        if change["origin"] == self.bot.instance_id:
+            return
+        if self._pending is not None:
+            self._pending.append(change)
+            return
+        apply_cache_change(self.bot, change["table"], change["rows"])
+
+    def _on_terminate(self, conn: Connection) -> None:
+        if self._closing:
+            return
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = self.bot.run_in_background(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        # Hold changes again so none are applied to caches about to be replaced
+        if self._pending is None:
+            self._pending = []
+        delay = 1.0
+        try:
+            while not self._closing:
+                try:
+                    if self._conn is None or self._conn.is_closed():
+                        await self.start()
+                    # Anything written while disconnected was missed
+                    await self._reload()
+                except (
+                    OSError,
+                    asyncio.TimeoutError,
+                    PostgresError,
+                    InterfaceError,
+                ) as e:
+                    # The pool is often as unhealthy as the listening connection
+                    log.warning(
+                        "cache listener recovery failed, retrying in %ss: %r", delay, e
+                    )
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 60.0)
+                    continue
+                if not self._conn.is_closed():
+                    break
+                # Dropped again while reloading, changes may have been missed
+        finally:
+            # Never left holding changes forever, even if recovery gave up
+            self.mark_ready()
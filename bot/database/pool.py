@@ -0,0 +1,56 @@
+import sys
+import time
+from typing import Any, Optional
+
+import asyncpg
+from utils.metrics import DB_ACQUIRE_SECONDS, DB_HELD_SECONDS
+
+
+class TimedPool:
+    """asyncpg.Pool wrapper timing connection use by the function acquiring it
+
+    Every `acquire` records how long the caller waited for a connection and how
+    long it held it, labelled with the calling function (Ex: request_guilds,
+    insert_users), so loaders, readers and writers are timed without changes.
+    Everything else is passed through to the pool.
+
+    Parameters
+    ----------
+    pool : asyncpg.Pool
+        the pool to time
+    """
+
+    def __init__(self, pool: asyncpg.Pool):
+        self._pool = pool
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+    def acquire(self, *, timeout: Optional[float] = None) -> "_TimedAcquire":
+        # Cheaper than inspect.stack(), only the caller's code object is read
+        function = sys._getframe(1).f_code.co_name
+        return _TimedAcquire(self._pool.acquire(timeout=timeout), function)
+
+
+class _TimedAcquire:
+    __slots__ = ("_context", "_function", "_acquired")
+
+    def __init__(self, context: Any, function: str):
+        self._context = context
+        self._function = function
+        self._acquired = 0.0
+
+    async def __aenter__(self) -> asyncpg.Connection:
+        start = time.perf_counter()
+        conn = await self._context.__aenter__()
+        self._acquired = time.perf_counter()
+        DB_ACQUIRE_SECONDS.observe(self._acquired - start, function=self._function)
+        return conn
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        try:
+            await self._context.__aexit__(*exc_info)
+        finally:
+            DB_HELD_SECONDS.observe(
+                time.perf_counter() - self._acquired, function=self._function
+            )
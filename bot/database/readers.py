@@ -1,16 +1,38 @@
-from typing import TYPE_CHECKING, Any, List, Mapping
+import re
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Collection,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
 
 from asyncpg import Connection
 
 if TYPE_CHECKING:
     from peterbot import PeterBot
 
+# Monthly partitions created by create_user_logs_partition()
+USER_LOG_PARTITION = re.compile(r"user_logs_y(\d{4})m(\d{2})")
+
 
 async def get_user_logs(
-    bot: "PeterBot", guild_id: int, user_id: int
+    bot: "PeterBot",
+    guild_id: int,
+    user_id: int,
+    limit: int = 50,
+    before: Optional[Tuple[datetime, int]] = None,
 ) -> List[Mapping[str, Any]]:
     """
-    Retrieve a list of user log data
+    Retrieve one page of user log data, newest first
+
+    Pages are fetched with keyset pagination on (msg_date, log_id). Pass the
+    `(message_date, log_id)` of the last row of a page as `before` to get the
+    next page. An empty list means there are no older logs.
 
     Parameters
     ----------
@@ -19,6 +41,10 @@ async def get_user_logs(
         snowflake id of guild we want logs from
     user_id : int
         snowflake id of user we want logs from
+    limit : int
+        (Optional) maximum number of rows returned. (Default=50)
+    before : Tuple[datetime, int]
+        (Optional) cursor, only rows older than it are returned
 
     Returns
     -------
@@ -27,6 +53,7 @@ async def get_user_logs(
 
         [
             {
+                'log_id' : int,
                 'guild_id' : int,
                 'user_id' : int,
                 'message_id' : int,
@@ -39,20 +66,170 @@ async def get_user_logs(
     results: list
     async with bot.db_pool.acquire() as conn:
         conn: Connection
-        query = await conn.prepare(
-            "SELECT * FROM user_logs ",
-            "WHERE guild_id = $1 AND user_id = $2 ",
-            "ORDER BY msg_date DESC",
-        )
+        if before is None:
+            query = await conn.prepare(
+                "SELECT log_id, guild_id, user_id, message_id, msg, msg_type, msg_date "
+                "FROM user_logs "
+                "WHERE guild_id = $1 AND user_id = $2 "
+                "ORDER BY msg_date DESC, log_id DESC "
+                "LIMIT $3"
+            )
+            rows = await query.fetch(guild_id, user_id, limit)
+        else:
+            query = await conn.prepare(
+                "SELECT log_id, guild_id, user_id, message_id, msg, msg_type, msg_date "
+                "FROM user_logs "
+                "WHERE guild_id = $1 AND user_id = $2 AND (msg_date, log_id) < ($3, $4) "
+                "ORDER BY msg_date DESC, log_id DESC "
+                "LIMIT $5"
+            )
+            rows = await query.fetch(guild_id, user_id, *before, limit)
         results = [
             {
+                "log_id": row["log_id"],
                 "guild_id": row["guild_id"],
                 "user_id": row["user_id"],
-                "message_id": row["mesage_id"],
+                "message_id": row["message_id"],
                 "message": row["msg"],
                 "message_type": row["msg_type"],
                 "message_date": row["msg_date"],
             }
-            for row in await query.fetch(guild_id, user_id)
+            for row in rows
         ]
     return results
+
+
+async def iter_user_logs(
+    bot: "PeterBot", guild_id: int, user_id: int, prefetch: int = 500
+) -> AsyncIterator[Mapping[str, Any]]:
+    """
+    Stream a user's full log history, newest first, through a server-side cursor
+
+    Only `prefetch` rows are held in memory at a time. A pool connection is held
+    until the iteration finishes, so consume it fully or close it with `aclose`.
+
+    Parameters
+    ----------
+    bot : PeterBot
+    guild_id : int
+        snowflake id of guild we want logs from
+    user_id : int
+        snowflake id of user we want logs from
+    prefetch : int
+        (Optional) rows fetched from the server per round-trip. (Default=500)
+
+    Yields
+    ------
+    dict
+        message data, in the same shape as `get_user_logs`
+    """
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        # Cursors only live inside a transaction
+        async with conn.transaction():
+            cursor = conn.cursor(
+                "SELECT log_id, guild_id, user_id, message_id, msg, msg_type, msg_date "
+                "FROM user_logs "
+                "WHERE guild_id = $1 AND user_id = $2 "
+                "ORDER BY msg_date DESC, log_id DESC",
+                guild_id,
+                user_id,
+                prefetch=prefetch,
+            )
+            async for row in cursor:
+                yield {
+                    "log_id": row["log_id"],
+                    "guild_id": row["guild_id"],
+                    "user_id": row["user_id"],
+                    "message_id": row["message_id"],
+                    "message": row["msg"],
+                    "message_type": row["msg_type"],
+                    "message_date": row["msg_date"],
+                }
+
+
+async def get_user_log_partitions(bot: "PeterBot") -> List[Tuple[str, datetime]]:
+    """
+    Retrieve the monthly user_logs partitions, oldest first
+
+    Parameters
+    ----------
+    bot : PeterBot
+
+    Returns
+    -------
+    list
+        partition names and the exclusive upper bound of their msg_date range
+
+        [(partition, upper_bound), ...]
+    """
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        query = await conn.prepare(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'user_logs'::regclass"
+        )
+        names = [row["relname"] for row in await query.fetch()]
+    results = []
+    for name in names:
+        match = USER_LOG_PARTITION.fullmatch(name)
+        if match is None:
+            continue
+        year, month = int(match[1]), int(match[2])
+        upper = datetime(year + month // 12, month % 12 + 1, 1)
+        results.append((name, upper))
+    return sorted(results, key=lambda partition: partition[1])
+
+
+async def user_log_partition_has_guilds(
+    bot: "PeterBot", partition: str, guild_ids: Collection[int]
+) -> bool:
+    """
+    Checks whether a user_logs partition holds rows for any of the given guilds
+
+    Parameters
+    ----------
+    bot : PeterBot
+    partition : str
+        partition name, as returned by `get_user_log_partitions`
+    guild_ids : Collection[int]
+        snowflake ids of the guilds to look for
+
+    Returns
+    -------
+    bool
+    """
+    if not USER_LOG_PARTITION.fullmatch(partition):
+        raise ValueError(f"{partition} is not a user_logs partition")
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        return await conn.fetchval(
+            f"SELECT EXISTS (SELECT 1 FROM {partition} WHERE guild_id = ANY($1))",
+            list(guild_ids),
+        )
+
+
+async def get_section_watches(bot: "PeterBot", user_id: int) -> List[Tuple[str, str]]:
+    """
+    Retrieve the sections a user is watching, oldest first
+
+    Parameters
+    ----------
+    bot : PeterBot
+    user_id : int
+        snowflake id of the user
+
+    Returns
+    -------
+    list
+        [(term, section_code), ...]
+    """
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        rows = await conn.fetch(
+            "SELECT term, section_code FROM section_watches "
+            "WHERE user_id = $1 ORDER BY created_at",
+            user_id,
+        )
+    return [(row["term"], row["section_code"]) for row in rows]
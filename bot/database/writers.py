@@ -1,7 +1,21 @@
+import json
 from datetime import datetime
-from typing import TYPE_CHECKING, Literal
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Iterable,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from asyncpg import Connection
+from asyncpg import Connection, Record
+from database.cache import normalize_alias
+from database.notifications import apply_cache_change, notify_cache_change
+from database.readers import USER_LOG_PARTITION
 
 if TYPE_CHECKING:
     from peterbot import PeterBot
@@ -25,13 +39,90 @@ async def insert_guild(
     -------
     None
     """
+    rows = [
+        {"guild_id": guild_id, "watch_mode": watch_mode, "log_retention_days": None}
+    ]
     async with bot.db_pool.acquire() as conn:
         conn: Connection
         async with conn.transaction():
             await conn.execute(
                 "INSERT INTO guilds VALUES ($1, $2)", guild_id, watch_mode
             )
-    bot.peter_guilds[guild_id]["watch_mode"] = watch_mode
+            await notify_cache_change(conn, bot, "guilds", rows)
+    apply_cache_change(bot, "guilds", rows)
+
+
+async def update_log_retention(
+    bot: "PeterBot", guild_id: int, days: Optional[int]
+) -> None:
+    """
+    Sets how long a guild's user_logs are kept and updates bot.peter_guilds
+
+    Parameters
+    ----------
+    bot : PeterBot
+    guild_id : int
+        the snowflake id of the guild
+    days : int
+        days to keep logs for, None keeps them forever
+
+    Returns
+    -------
+    None
+    """
+    rows = [{"guild_id": guild_id, "log_retention_days": days}]
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        async with conn.transaction():
+            await conn.execute(
+                "UPDATE guilds SET log_retention_days = $2 WHERE guild_id = $1",
+                guild_id,
+                days,
+            )
+            await notify_cache_change(conn, bot, "guilds", rows)
+    apply_cache_change(bot, "guilds", rows)
+
+
+async def insert_guilds(
+    bot: "PeterBot", guild_ids: Iterable[int], watch_mode: bool = False
+) -> None:
+    """
+    Adds many guilds in one statement and updates bot.peter_guilds
+
+    Guilds that already exist are left untouched.
+
+    Parameters
+    ----------
+    bot : PeterBot
+    guild_ids : Iterable[int]
+        the snowflake ids of the guilds
+    watch_mode : bool
+        boolean for whether to log messages
+
+    Returns
+    -------
+    None
+    """
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        async with conn.transaction():
+            inserted = await conn.fetch(
+                "INSERT INTO guilds (guild_id, watch_mode) "
+                "SELECT unnest($1::BIGINT[]), $2 "
+                "ON CONFLICT DO NOTHING RETURNING guild_id",
+                list(guild_ids),
+                watch_mode,
+            )
+            rows = [
+                {
+                    "guild_id": row["guild_id"],
+                    "watch_mode": watch_mode,
+                    "log_retention_days": None,
+                }
+                for row in inserted
+            ]
+            await notify_cache_change(conn, bot, "guilds", rows)
+    apply_cache_change(bot, "guilds", rows)
 
 
 async def insert_user(bot: "PeterBot", guild_id: int, user_id: int) -> None:
@@ -50,18 +141,65 @@ async def insert_user(bot: "PeterBot", guild_id: int, user_id: int) -> None:
     -------
     None
     """
+    rows = [{"guild_id": guild_id, "user_id": user_id}]
     async with bot.db_pool.acquire() as conn:
         conn: Connection
         async with conn.transaction():
             await conn.execute("INSERT INTO users VALUES ($1, $2)", user_id, guild_id)
-        bot.peter_users[guild_id].add(user_id)
+            await notify_cache_change(conn, bot, "users", rows)
+    apply_cache_change(bot, "users", rows)
+
+
+async def insert_users(bot: "PeterBot", guild_id: int, user_ids: Iterable[int]) -> int:
+    """
+    Adds many users to a guild in one transaction and updates bot.peter_users
+
+    Users already registered to the guild are skipped, so re-running is safe.
+
+    Parameters
+    ----------
+    bot : PeterBot
+    guild_id : int
+        snowflake id of the guild
+    user_ids : Iterable[int]
+        snowflake ids of the users
+
+    Returns
+    -------
+    int
+        number of users that were not registered before
+    """
+    records = [(user_id, guild_id) for user_id in dict.fromkeys(user_ids)]
+    if not records:
+        return 0
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        async with conn.transaction():
+            inserted = await _copy_upsert(
+                conn,
+                "users",
+                ("user_id", "guild_id"),
+                records,
+                "ON CONFLICT DO NOTHING",
+            )
+            await notify_cache_change(
+                conn,
+                bot,
+                "users",
+                [{"guild_id": guild_id, "user_id": row["user_id"]} for row in inserted],
+            )
+    apply_cache_change(
+        bot, "users", [{"guild_id": guild_id, "user_id": r[0]} for r in records]
+    )
+    return len(inserted)
 
 
 async def insert_catalogue_alias(
     bot: "PeterBot", guild_id: int, alias: str, department: str
 ) -> None:
     """
-    Adds a new alias for a department and updates bot.peter_catalogue_aliases
+    Adds or replaces a guild's alias for a department and updates
+    bot.peter_catalogue_aliases
 
     Parameters
     ----------
@@ -69,7 +207,7 @@ async def insert_catalogue_alias(
     guild_id : int
         snowflake id of the guild
     alias : str
-        given alias for a department
+        given alias for a department, matched case-insensitively
     department : str
         given department
 
@@ -77,16 +215,73 @@ async def insert_catalogue_alias(
     -------
     None
     """
+    alias, department = normalize_alias(alias), department.upper()
+    rows = [{"guild_id": guild_id, "alias": alias, "department": department}]
     async with bot.db_pool.acquire() as conn:
         conn: Connection
         async with conn.transaction():
             await conn.execute(
-                "INSERT INTO catalogue_alias VALUES ($1, $2, $3)",
+                "INSERT INTO catalogue_alias (guild_id, department, alias) "
+                "VALUES ($1, $2, $3) "
+                "ON CONFLICT (guild_id, alias) DO UPDATE SET department = $2",
                 guild_id,
                 department,
                 alias,
             )
-        bot.peter_catalogue_aliases[guild_id][alias] = department
+            await notify_cache_change(conn, bot, "catalogue_alias", rows)
+    apply_cache_change(bot, "catalogue_alias", rows)
+
+
+async def insert_catalogue_aliases(
+    bot: "PeterBot", guild_id: int, aliases: Mapping[str, str]
+) -> None:
+    """
+    Adds or replaces many department aliases in one transaction and updates
+    bot.peter_catalogue_aliases
+
+    Parameters
+    ----------
+    bot : PeterBot
+    guild_id : int
+        snowflake id of the guild
+    aliases : Mapping[str, str]
+        departments by alias, aliases are matched case-insensitively
+
+        {
+            'alias' : 'department', ...
+        }
+
+    Returns
+    -------
+    None
+    """
+    if not aliases:
+        return
+    # Aliases differing only in case are one alias, keep the last given
+    normalized = {
+        normalize_alias(alias): department.upper()
+        for alias, department in aliases.items()
+    }
+    records = [
+        (guild_id, department, alias) for alias, department in normalized.items()
+    ]
+    rows = [
+        {"guild_id": guild_id, "alias": alias, "department": department}
+        for _, department, alias in records
+    ]
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        async with conn.transaction():
+            await _copy_upsert(
+                conn,
+                "catalogue_alias",
+                ("guild_id", "department", "alias"),
+                records,
+                "ON CONFLICT (guild_id, alias) "
+                "DO UPDATE SET department = EXCLUDED.department",
+            )
+            await notify_cache_change(conn, bot, "catalogue_alias", rows)
+    apply_cache_change(bot, "catalogue_alias", rows)
 
 
 async def insert_channel(bot: "PeterBot", guild_id: int, channel_id: int) -> None:
@@ -105,13 +300,64 @@ async def insert_channel(bot: "PeterBot", guild_id: int, channel_id: int) -> Non
     -------
     None
     """
+    rows = [{"guild_id": guild_id, "channel_id": channel_id}]
     async with bot.db_pool.acquire() as conn:
         conn: Connection
         async with conn.transaction():
             await conn.execute(
                 "INSERT INTO channels VALUES ($1, $2)", channel_id, guild_id
             )
-        bot.peter_channels[guild_id].add(channel_id)
+            await notify_cache_change(conn, bot, "channels", rows)
+    apply_cache_change(bot, "channels", rows)
+
+
+async def insert_channels(
+    bot: "PeterBot", guild_id: int, channel_ids: Iterable[int]
+) -> int:
+    """
+    Adds many channels in one transaction and updates bot.peter_channels
+
+    Channels that already exist are skipped, so re-running is safe.
+
+    Parameters
+    ----------
+    bot : PeterBot
+    guild_id : int
+        snowflake id of the guild
+    channel_ids : Iterable[int]
+        snowflake ids of the channels
+
+    Returns
+    -------
+    int
+        number of channels that did not exist before
+    """
+    records = [(channel_id, guild_id) for channel_id in dict.fromkeys(channel_ids)]
+    if not records:
+        return 0
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        async with conn.transaction():
+            inserted = await _copy_upsert(
+                conn,
+                "channels",
+                ("channel_id", "guild_id"),
+                records,
+                "ON CONFLICT DO NOTHING",
+            )
+            await notify_cache_change(
+                conn,
+                bot,
+                "channels",
+                [
+                    {"guild_id": guild_id, "channel_id": row["channel_id"]}
+                    for row in inserted
+                ],
+            )
+    apply_cache_change(
+        bot, "channels", [{"guild_id": guild_id, "channel_id": r[0]} for r in records]
+    )
+    return len(inserted)
 
 
 async def insert_voice_channel(
@@ -136,6 +382,14 @@ async def insert_voice_channel(
     -------
     None
     """
+    rows = [
+        {
+            "guild_id": guild_id,
+            "voice_id": voice_id,
+            "text_id": text_id,
+            "role_id": role_id,
+        }
+    ]
     async with bot.db_pool.acquire() as conn:
         conn: Connection
         async with conn.transaction():
@@ -146,9 +400,190 @@ async def insert_voice_channel(
                 text_id,
                 role_id,
             )
-        bot.peter_voice_channels[guild_id][voice_id] = {}
-        bot.peter_voice_channels[guild_id][voice_id]["text_id"] = text_id
-        bot.peter_voice_channels[guild_id][voice_id]["role_id"] = role_id
+            await notify_cache_change(conn, bot, "voice_channels", rows)
+    apply_cache_change(bot, "voice_channels", rows)
+
+
+async def insert_section_watch(
+    bot: "PeterBot", user_id: int, term: str, section_code: str
+) -> bool:
+    """
+    Subscribes a user to enrollment changes of a section
+
+    Parameters
+    ----------
+    bot : PeterBot
+    user_id : int
+        snowflake id of the user
+    term : str
+        term of the section, Ex: 2022 Fall
+    section_code : str
+        WebReg section code
+
+    Returns
+    -------
+    bool
+        False if the user was already watching the section
+    """
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        status = await conn.execute(
+            "INSERT INTO section_watches (user_id, term, section_code) "
+            "VALUES ($1, $2, $3) ON CONFLICT DO NOTHING",
+            user_id,
+            term,
+            section_code,
+        )
+    return status == "INSERT 0 1"
+
+
+async def delete_section_watch(
+    bot: "PeterBot", user_id: int, term: str, section_code: str
+) -> bool:
+    """
+    Unsubscribes a user from a section
+
+    Parameters
+    ----------
+    bot : PeterBot
+    user_id : int
+        snowflake id of the user
+    term : str
+        term of the section, Ex: 2022 Fall
+    section_code : str
+        WebReg section code
+
+    Returns
+    -------
+    bool
+        False if the user wasn't watching the section
+    """
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        status = await conn.execute(
+            "DELETE FROM section_watches "
+            "WHERE user_id = $1 AND term = $2 AND section_code = $3",
+            user_id,
+            term,
+            section_code,
+        )
+    return status == "DELETE 1"
+
+
+async def upsert_catalogue_cache(bot: "PeterBot", cache_key: str, payload: Any) -> None:
+    """
+    Persists a PeterPortal response so caches survive restarts
+
+    Parameters
+    ----------
+    bot : PeterBot
+    cache_key : str
+        key the payload is cached under
+    payload : Any
+        JSON serializable API response
+
+    Returns
+    -------
+    None
+    """
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        async with conn.transaction():
+            await conn.execute(
+                "INSERT INTO catalogue_cache (cache_key, payload) VALUES ($1, $2::jsonb) "
+                "ON CONFLICT (cache_key) DO UPDATE "
+                "SET payload = EXCLUDED.payload, fetched_at = EXCLUDED.fetched_at",
+                cache_key,
+                json.dumps(payload),
+            )
+
+
+async def create_user_log_partitions(bot: "PeterBot", months_ahead: int = 1) -> None:
+    """
+    Creates the monthly user_logs partitions for this month and the coming ones
+
+    Partitions are created ahead of time so rows never land in the default
+    partition. Existing partitions are left untouched.
+
+    Parameters
+    ----------
+    bot : PeterBot
+    months_ahead : int
+        (Optional) number of future months to create. (Default=1)
+
+    Returns
+    -------
+    None
+    """
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        await conn.executemany(
+            "SELECT create_user_logs_partition("
+            "(CURRENT_DATE + make_interval(months => $1))::DATE)",
+            [(month,) for month in range(months_ahead + 1)],
+        )
+
+
+async def delete_user_logs_before(
+    bot: "PeterBot", guild_id: int, cutoff: datetime, batch_size: int = 5000
+) -> int:
+    """
+    Deletes one batch of a guild's user_logs older than cutoff
+
+    Deleting in small batches keeps each transaction and its locks short. Call
+    repeatedly until fewer than `batch_size` rows are removed.
+
+    Parameters
+    ----------
+    bot : PeterBot
+    guild_id : int
+        snowflake id of the guild
+    cutoff : datetime
+        rows with an earlier msg_date are removed
+    batch_size : int
+        (Optional) maximum rows removed. (Default=5000)
+
+    Returns
+    -------
+    int
+        number of rows removed
+    """
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        status = await conn.execute(
+            "DELETE FROM user_logs WHERE (msg_date, log_id) IN ("
+            "SELECT msg_date, log_id FROM user_logs "
+            "WHERE guild_id = $1 AND msg_date < $2 LIMIT $3)",
+            guild_id,
+            cutoff,
+            batch_size,
+        )
+    return int(status.split()[-1])
+
+
+async def drop_user_log_partition(bot: "PeterBot", partition: str) -> int:
+    """
+    Drops a whole monthly user_logs partition
+
+    Parameters
+    ----------
+    bot : PeterBot
+    partition : str
+        partition name, as returned by `readers.get_user_log_partitions`
+
+    Returns
+    -------
+    int
+        number of rows removed
+    """
+    if not USER_LOG_PARTITION.fullmatch(partition):
+        raise ValueError(f"{partition} is not a user_logs partition")
+    async with bot.db_pool.acquire() as conn:
+        conn: Connection
+        async with conn.transaction():
+            rows = await conn.fetchval(f"SELECT count(*) FROM {partition}")
+            await conn.execute(f"DROP TABLE {partition}")
+    return rows
 
 
 MESSAGE_TYPE = Literal["Original", "Edit: before", "Edit: after", "Deletion"]
@@ -193,7 +628,9 @@ async def insert_user_message(
         conn: Connection
         async with conn.transaction():
             await conn.execute(
-                "INSERT INTO user_logs VALUES ($1, $2, $3, $4, $5, $6, $7)",
+                "INSERT INTO user_logs "
+                "(user_id, channel_id, guild_id, message_id, msg, msg_type, msg_date) "
+                "VALUES ($1, $2, $3, $4, $5, $6, $7)",
                 user_id,
                 channel_id,
                 guild_id,
@@ -202,3 +639,62 @@ async def insert_user_message(
                 message_type,
                 message_date,
             )
+
+
+async def queue_user_message(
+    bot: "PeterBot",
+    guild_id: int,
+    channel_id: int,
+    user_id: int,
+    message_id: int,
+    message: str,
+    message_type: MESSAGE_TYPE,
+    message_date: datetime,
+) -> None:
+    """
+    Queues a user message on bot.user_log_buffer to be written in a batch
+
+    Waits only when the buffer is full. Parameters match `insert_user_message`.
+
+    Returns
+    -------
+    None
+    """
+    await bot.user_log_buffer.put(
+        (
+            user_id,
+            channel_id,
+            guild_id,
+            message_id,
+            message,
+            message_type,
+            message_date,
+        )
+    )
+
+
+async def _copy_upsert(
+    conn: Connection,
+    table: str,
+    columns: Sequence[str],
+    records: List[Tuple[Any, ...]],
+    on_conflict: str,
+) -> List[Record]:
+    """
+    COPYs records into a temporary table and moves them into `table` with a
+    single INSERT ... SELECT, returning the rows actually inserted or updated
+
+    Must be called inside a transaction, the temporary table is dropped on commit.
+    """
+    staging = f"{table}_staging"
+    column_list = ", ".join(columns)
+    await conn.execute(
+        f"CREATE TEMPORARY TABLE {staging} "
+        f"(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+    )
+    await conn.copy_records_to_table(staging, records=records, columns=columns)
+    return await conn.fetch(
+        f"INSERT INTO {table} ({column_list}) "
+        f"SELECT {column_list} FROM {staging} "
+        f"{on_conflict} RETURNING {column_list}"
+    )
@@ -1,6 +1,12 @@
 import asyncio
+import logging
+import multiprocessing
 import os
+import signal
+import time
+from typing import List, Optional
 
+import discord
 from peterbot import PeterBot
 
 try:
@@ -11,12 +17,154 @@ else:
     asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
 bot_token = os.environ["BOT_TOKEN"]
+# single:  one process, one shard
+# auto:    one process, Discord's recommended shard count
+# cluster: SHARD_COUNT shards spread over CLUSTER_COUNT worker processes
+shard_mode = os.environ.get("SHARD_MODE", "single")
+shard_count = int(os.environ.get("SHARD_COUNT") or 0) or None
+cluster_count = int(os.environ.get("CLUSTER_COUNT") or 0) or os.cpu_count() or 1
+# Seconds waited per shard before launching the next cluster, staggers gateway
+# identifies across processes
+cluster_start_delay = float(os.environ.get("CLUSTER_START_DELAY", 5.0))
 
+log = logging.getLogger(__name__)
 
-def run_bot():
-    bot: PeterBot = PeterBot()
-    bot.run(bot_token)
+
+def run_bot(
+    shard_ids: Optional[List[int]] = None,
+    shard_count: Optional[int] = None,
+    cluster_id: Optional[int] = None,
+):
+    bot: PeterBot = PeterBot(
+        shard_ids=shard_ids, shard_count=shard_count, cluster_id=cluster_id
+    )
+    # Logs of the bot's own modules go to the same handler as discord.py's
+    bot.run(bot_token, root_logger=True)
+
+
+def shard_ranges(shard_count: int, cluster_count: int) -> List[List[int]]:
+    """Splits shard ids into contiguous ranges, one per cluster"""
+    cluster_count = min(cluster_count, shard_count)
+    size, extra = divmod(shard_count, cluster_count)
+    ranges = []
+    start = 0
+    for cluster_id in range(cluster_count):
+        end = start + size + (cluster_id < extra)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class ClusterSupervisor:
+    """Runs one bot process per cluster of shards and restarts crashed clusters
+
+    Each cluster is its own process with its own event loop and database pool.
+    A cluster that exits is restarted after a backoff that doubles while it keeps
+    crashing, and resets once it has stayed up for `stable_after` seconds.
+
+    Parameters
+    ----------
+    shard_count : int
+        Total number of shards
+    cluster_count : int
+        Number of worker processes
+    start_delay : float
+        Seconds waited per shard of a cluster before launching the next one
+    stable_after : float
+        (Optional) Seconds a cluster must run to reset its backoff. (Default=300)
+    """
+
+    def __init__(
+        self,
+        shard_count: int,
+        cluster_count: int,
+        start_delay: float,
+        stable_after: float = 300.0,
+    ):
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, cluster_count)
+        self.start_delay = start_delay
+        self.stable_after = stable_after
+        # Spawned workers get a fresh interpreter rather than a forked event loop
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * len(
+            self.ranges
+        )
+        self._started = [0.0] * len(self.ranges)
+        self._backoff = [1.0] * len(self.ranges)
+        self._restart_at = [0.0] * len(self.ranges)
+        self._stopping = False
+
+    def _start(self, cluster_id: int) -> None:
+        process = self._context.Process(
+            target=run_bot,
+            args=(self.ranges[cluster_id], self.shard_count, cluster_id),
+            name=f"peterbot-cluster-{cluster_id}",
+        )
+        process.start()
+        self._processes[cluster_id] = process
+        self._started[cluster_id] = time.monotonic()
+        log.info(
+            "cluster %d started (pid %d, shards %d-%d)",
+            cluster_id,
+            process.pid,
+            self.ranges[cluster_id][0],
+            self.ranges[cluster_id][-1],
+        )
+
+    def _stop(self, *_) -> None:
+        self._stopping = True
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGTERM, self._stop)
+
+        for cluster_id in range(len(self.ranges)):
+            if self._stopping:
+                break
+            self._start(cluster_id)
+            time.sleep(self.start_delay * len(self.ranges[cluster_id]))
+
+        while not self._stopping:
+            now = time.monotonic()
+            for cluster_id, process in enumerate(self._processes):
+                if process is None or process.is_alive():
+                    continue
+                if self._restart_at[cluster_id] == 0.0:
+                    if now - self._started[cluster_id] >= self.stable_after:
+                        self._backoff[cluster_id] = 1.0
+                    self._restart_at[cluster_id] = now + self._backoff[cluster_id]
+                    log.warning(
+                        "cluster %d exited (%s), restarting in %.0fs",
+                        cluster_id,
+                        process.exitcode,
+                        self._backoff[cluster_id],
+                    )
+                    self._backoff[cluster_id] = min(self._backoff[cluster_id] * 2, 60)
+                elif now >= self._restart_at[cluster_id]:
+                    self._restart_at[cluster_id] = 0.0
+                    self._start(cluster_id)
+            time.sleep(1.0)
+
+        # SIGINT lets each bot close cleanly (flushing buffers) before we insist
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout=30)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
 
 
 if __name__ == "__main__":
-    run_bot()
+    if shard_mode == "cluster":
+        if shard_count is None:
+            raise RuntimeError("SHARD_COUNT must be set when SHARD_MODE=cluster")
+        discord.utils.setup_logging(root=True)
+        ClusterSupervisor(shard_count, cluster_count, cluster_start_delay).run()
+    elif shard_mode == "auto":
+        run_bot(shard_count=shard_count)
+    else:
+        run_bot(shard_ids=[0], shard_count=1)
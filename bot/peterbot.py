@@ -1,18 +1,68 @@
+import asyncio
+import logging
 import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Coroutine, Dict, Iterator, List, Optional, Set
+from urllib.parse import parse_qs
 
+import aiohttp
 import asyncpg
 import discord
 from database import loaders, writers
+from database.buffers import UserLogBuffer
+from database.cache import (
+    CatalogueAliasIndex,
+    GuildConfig,
+    GuildMembership,
+    VoiceChannelIndex,
+)
+from database.notifications import CacheListener
+from database.pool import TimedPool
 from discord.ext import commands
+from utils import metrics
+from utils.cache import TTLCache
+from utils.http import HTTPClient
+from utils.profiler import LoopWatchdog
+from utils.scheduler import RequestScheduler
+from utils.soc_index import SearchCompletions, SocIndex
 
-initial_cogs = ("cogs.utilities", "cogs.schedule")
+initial_cogs = (
+    "cogs.onhandling",
+    "cogs.utilities",
+    "cogs.schedule",
+    "cogs.retention",
+    "cogs.enrollment",
+    "cogs.voice",
+)
 
-bot_owner = os.environ["OWNER_ID"]
+log = logging.getLogger(__name__)
+
+bot_owner = int(os.environ["OWNER_ID"])
 db_user = os.environ["POSTGRES_USER"]
 db_password = os.environ["POSTGRES_PASSWORD"]
 db_host = os.environ["POSTGRES_HOST"]
 db_port = os.environ["POSTGRES_PORT"]
 db_database = os.environ["POSTGRES_DB"]
+soc_cache_ttl = float(os.environ.get("SOC_CACHE_TTL", 60))
+course_cache_ttl = float(os.environ.get("COURSE_CACHE_TTL", 60 * 60 * 24))
+# How long past expiry a persisted entry may still be served while it refreshes
+soc_cache_stale_ttl = float(os.environ.get("SOC_CACHE_STALE_TTL", 60 * 10))
+course_cache_stale_ttl = float(
+    os.environ.get("COURSE_CACHE_STALE_TTL", 60 * 60 * 24 * 30)
+)
+command_sync_concurrency = int(os.environ.get("COMMAND_SYNC_CONCURRENCY", 5))
+# Guilds whose members and channels are synced at the same time
+guild_sync_concurrency = int(os.environ.get("GUILD_SYNC_CONCURRENCY", 2))
+# Prometheus endpoint, clusters listen on consecutive ports, 0 disables it
+metrics_host = os.environ.get("METRICS_HOST", "127.0.0.1")
+metrics_port = int(os.environ.get("METRICS_PORT", 9464))
+# Seconds the event loop may block before the watchdog logs its stack, 0 disables it
+loop_stall_threshold = float(os.environ.get("LOOP_STALL_THRESHOLD", 0.25))
+# Requests per second, and back to back requests, sent to PeterPortal
+peterportal_rate = float(os.environ.get("PETERPORTAL_RATE", 5))
+peterportal_burst = int(os.environ.get("PETERPORTAL_BURST", 10))
 
 
 def _prefix_callable(bot, msg):
@@ -21,8 +71,26 @@ def _prefix_callable(bot, msg):
     return base
 
 
-class PeterBot(commands.Bot):
-    def __init__(self):
+class PeterBot(commands.AutoShardedBot):
+    """The bot
+
+    Parameters
+    ----------
+    shard_ids : List[int]
+        (Optional) Shards run by this process, all of them when omitted
+    shard_count : int
+        (Optional) Total shards across every process, Discord's recommendation
+        when omitted
+    cluster_id : int
+        (Optional) Cluster this process runs when clustered by the launcher
+    """
+
+    def __init__(
+        self,
+        shard_ids: Optional[List[int]] = None,
+        shard_count: Optional[int] = None,
+        cluster_id: Optional[int] = None,
+    ):
         intents = discord.Intents().all()
         application_id = int(os.environ["APPLICATION_ID"])
         super().__init__(
@@ -30,7 +98,52 @@ class PeterBot(commands.Bot):
             intents=intents,
             owner_id=bot_owner,
             application_id=application_id,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+        )
+        self.cluster_id = cluster_id
+        self.http_client: Optional[HTTPClient] = None
+        self.metrics_server: Optional[metrics.MetricsServer] = None
+        self.watchdog: Optional[LoopWatchdog] = None
+        self.peterportal: Optional[RequestScheduler] = None
+        self.db_pool: Optional[TimedPool] = None
+        self.user_log_buffer: Optional[UserLogBuffer] = None
+        self.cache_listener: Optional[CacheListener] = None
+        # In-memory copies of the cached tables, filled by load_caches
+        self.peter_guilds: Dict[int, GuildConfig] = {}
+        self.peter_users = GuildMembership()
+        self.peter_channels = GuildMembership()
+        self.peter_voice_channels = VoiceChannelIndex()
+        self.peter_catalogue_aliases = CatalogueAliasIndex()
+        # Identifies this process's own cache change notifications
+        self.instance_id = uuid.uuid4().hex
+        # PeterPortal response caches
+        # Live SOC data (enrollment counts) goes stale quickly, catalogue data doesn't
+        # Expired responses are served while PeterPortal is failing
+        self.soc_cache = TTLCache(
+            maxsize=512,
+            ttl=soc_cache_ttl,
+            stale_ttl=soc_cache_stale_ttl,
+            fallback_on=(aiohttp.ClientError, asyncio.TimeoutError),
+        )
+        self.course_cache = TTLCache(
+            maxsize=4096,
+            ttl=course_cache_ttl,
+            stale_ttl=course_cache_stale_ttl,
+            fallback_on=(aiohttp.ClientError, asyncio.TimeoutError),
         )
+        # Section indexes of cached SOC listings, answers filtered searches locally
+        self.soc_index = SocIndex()
+        # Terms, departments and instructors of fetched listings, for autocomplete
+        self.soc_completions = SearchCompletions()
+        self.background_tasks: Set[asyncio.Task] = set()
+        self.command_sync_limit = asyncio.Semaphore(command_sync_concurrency)
+        self.guild_sync_limit = asyncio.Semaphore(guild_sync_concurrency)
+        # Guilds joined while offline, synced once they become available
+        self.unsynced_guilds: Set[int] = set()
+        self.startup_timings: Dict[str, float] = {}
+        self.before_invoke(self._before_command)
+        self.after_invoke(self._after_command)
 
     async def setup_hook(self):
         """
@@ -38,38 +151,390 @@ class PeterBot(commands.Bot):
 
         Functional override of discord.Client.setup_hook
         """
+        # Shared HTTP client, pooled for the lifetime of the bot
+        self.http_client = HTTPClient()
+        self.peterportal = RequestScheduler(
+            self.http_client, rate=peterportal_rate, burst=peterportal_burst
+        )
+        self._register_metrics()
+        self.run_in_background(metrics.monitor_loop_lag())
+        if loop_stall_threshold:
+            self.watchdog = LoopWatchdog(
+                asyncio.get_running_loop(), threshold=loop_stall_threshold
+            )
+            self.watchdog.start()
+        if metrics_port:
+            self.metrics_server = metrics.MetricsServer(
+                metrics_host, metrics_port + (self.cluster_id or 0)
+            )
+            await self.metrics_server.start()
         # Load cogs
-        for cog in initial_cogs:
-            print(f"loading cog {cog}...")
-            await self.load_extension(cog)
-        # create database connection pools
-        self.db_pool = await asyncpg.create_pool(
+        with self._startup_phase("cogs"):
+            for cog in initial_cogs:
+                log.info("loading cog %s...", cog)
+                await self.load_extension(cog)
+        # create database connection pools, timed by the function acquiring them
+        with self._startup_phase("database"):
+            pool = await asyncpg.create_pool(
+                user=db_user,
+                password=db_password,
+                host=db_host,
+                port=db_port,
+                database=db_database,
+            )
+            self.db_pool = TimedPool(pool)
+            await writers.create_user_log_partitions(self)
+        # Message logs are written in batches behind the event handlers
+        self.user_log_buffer = UserLogBuffer(self)
+        self.user_log_buffer.start()
+        # Load caches
+        # Certain tables are cached to avoid making calls to the database
+        # Changes made by other instances are applied through LISTEN/NOTIFY, the
+        # listener starts first so nothing written during the load is missed
+        with self._startup_phase("caches"):
+            self.cache_listener = CacheListener(
+                self, self._connect_db, self.load_caches
+            )
+            await self.cache_listener.start()
+            await self.load_caches()
+            self.cache_listener.mark_ready()
+        # Warm PeterPortal caches from their persisted copies without delaying startup
+        self.run_in_background(self.warm_catalogue_cache())
+        # Add new guilds in one statement
+        with self._startup_phase("guilds"):
+            new_guilds = [
+                guild.id
+                async for guild in self.fetch_guilds(limit=None)
+                if guild.id not in self.peter_guilds and self.owns_guild(guild.id)
+            ]
+            if new_guilds:
+                await writers.insert_guilds(self, new_guilds)
+                self.unsynced_guilds.update(new_guilds)
+
+        with self._startup_phase("command sync"):
+            await asyncio.gather(
+                *(
+                    self._sync_guild_commands(guild_id)
+                    for guild_id in self.peter_guilds
+                    if self.owns_guild(guild_id)
+                )
+            )
+            if self.primary:
+                await self.tree.sync()
+
+        log.info(
+            "startup: %s",
+            ", ".join(
+                f"{phase} {seconds:.2f}s"
+                for phase, seconds in self.startup_timings.items()
+            ),
+        )
+
+    @property
+    def primary(self) -> bool:
+        """Whether this process runs once-per-deployment work, like global syncs"""
+        return self.cluster_id is None or self.cluster_id == 0
+
+    def owns_guild(self, guild_id: int) -> bool:
+        """
+        Whether a guild is served by one of this process's shards
+
+        Parameters
+        ----------
+        guild_id : int
+            snowflake id of the guild
+
+        Returns
+        -------
+        bool
+        """
+        if self.shard_ids is None:
+            return True
+        return (guild_id >> 22) % self.shard_count in self.shard_ids
+
+    async def load_caches(self) -> None:
+        """
+        Loads every cached table, each loader on its own pool connection
+        """
+        (
+            self.peter_guilds,
+            self.peter_users,
+            self.peter_channels,
+            self.peter_voice_channels,
+            self.peter_catalogue_aliases,
+        ) = await asyncio.gather(
+            loaders.request_guilds(self),
+            loaders.request_users(self),
+            loaders.request_channels(self),
+            loaders.request_voice_channels(self),
+            loaders.request_catalogue_aliases(self),
+        )
+
+    async def _connect_db(self) -> asyncpg.Connection:
+        return await asyncpg.connect(
             user=db_user,
             password=db_password,
             host=db_host,
             port=db_port,
             database=db_database,
         )
-        # Load caches
-        # Certain tables are cached to avoid making calls to the database
-        self.peter_guilds = await loaders.request_guilds(self)
-        self.peter_users = await loaders.request_users(self)
-        self.peter_channels = await loaders.request_channels(self)
-        self.peter_voice_channels = await loaders.request_voice_channels(self)
-        self.peter_catalogue_aliases = await loaders.request_catalogue_aliases(self)
-        # Add new guilds
-        async for guild in self.fetch_guilds(limit=None):
-            if guild.id not in self.peter_guilds:
-                await writers.insert_guild(self, guild.id)
-
-        for guild_id in self.peter_guilds.keys():
-            self.tree.copy_global_to(guild=discord.Object(id=guild_id))
-            await self.tree.sync(guild=discord.Object(id=guild_id))
-        await self.tree.sync()
+
+    async def _sync_guild_commands(self, guild_id: int) -> None:
+        """Syncs the command tree to one guild, bounded by command_sync_limit
+
+        discord.py waits out 429s on its own, the semaphore keeps a large guild
+        count from tripping the global rate limit in the first place.
+        """
+        guild = discord.Object(id=guild_id)
+        async with self.command_sync_limit:
+            self.tree.copy_global_to(guild=guild)
+            try:
+                await self.tree.sync(guild=guild)
+            except discord.HTTPException as e:
+                log.warning("failed to sync commands to guild %s: %s", guild_id, e)
+
+    async def sync_guild(self, guild: discord.Guild, batch_size: int = 1000) -> None:
+        """
+        Registers a guild's members and text channels that aren't in the caches
+
+        Members are requested over the gateway if the guild isn't chunked yet, then
+        diffed against bot.peter_users and written in batches. At most
+        `guild_sync_concurrency` guilds are synced at once, and the event loop is
+        yielded to between batches so large guilds don't hold it.
+
+        Parameters
+        ----------
+        guild : discord.Guild
+            the guild to sync
+        batch_size : int
+            (Optional) members diffed and written per batch. (Default=1000)
+
+        Returns
+        -------
+        None
+        """
+        async with self.guild_sync_limit:
+            start = time.perf_counter()
+            new_channels = [
+                channel.id
+                for channel in guild.text_channels
+                if not self.peter_channels.contains(guild.id, channel.id)
+            ]
+            await writers.insert_channels(self, guild.id, new_channels)
+
+            if not guild.chunked:
+                await guild.chunk()
+            members = guild.members
+            new_users = 0
+            for i in range(0, len(members), batch_size):
+                user_ids = [
+                    member.id
+                    for member in members[i : i + batch_size]
+                    if not member.bot
+                    and not self.peter_users.contains(guild.id, member.id)
+                ]
+                new_users += await writers.insert_users(self, guild.id, user_ids)
+                await asyncio.sleep(0)
+            log.info(
+                "synced guild %s: %d users, %d channels in %.2fs",
+                guild.id,
+                new_users,
+                len(new_channels),
+                time.perf_counter() - start,
+            )
+
+    async def _before_command(self, ctx: commands.Context) -> None:
+        ctx.started_at = time.perf_counter()
+
+    async def _after_command(self, ctx: commands.Context) -> None:
+        metrics.COMMAND_SECONDS.observe(
+            time.perf_counter() - ctx.started_at,
+            command=ctx.command.qualified_name,
+            kind="prefix",
+            status="failed" if ctx.command_failed else "ok",
+        )
+
+    async def on_app_command_completion(
+        self, interaction: discord.Interaction, command: discord.app_commands.Command
+    ):
+        # Slash commands have no invoke hooks, time them from the interaction's
+        # creation, which includes its delivery over the gateway
+        metrics.COMMAND_SECONDS.observe(
+            (discord.utils.utcnow() - interaction.created_at).total_seconds(),
+            command=command.qualified_name,
+            kind="slash",
+            status="ok",
+        )
+
+    def _register_metrics(self) -> None:
+        """Exposes the counters kept by caches, the scheduler and the pool"""
+        caches = {"soc": self.soc_cache, "course": self.course_cache}
+        results = (
+            ("hit", "hits"),
+            ("stale", "stale_hits"),
+            ("miss", "misses"),
+            ("coalesced", "coalesced"),
+            ("fallback", "fallback_hits"),
+        )
+
+        def cache_lookups():
+            for name, cache in caches.items():
+                for result, counter in results:
+                    yield (name, result), getattr(cache, counter)
+
+        def cache_hit_ratios():
+            for name, cache in caches.items():
+                yield (name,), cache.hit_ratio
+            index = self.soc_index
+            lookups = index.hits + index.builds
+            yield ("soc_index",), index.hits / lookups if lookups else 0.0
+
+        def peterportal_requests():
+            if self.peterportal is not None:
+                for result in ("requests", "retried", "failed", "rejected"):
+                    yield (result,), getattr(self.peterportal, result)
+
+        def circuit_open():
+            if self.peterportal is not None:
+                yield (), float(self.peterportal.state != "closed")
+
+        def pool_connections():
+            if self.db_pool is not None:
+                yield ("open",), self.db_pool.get_size()
+                yield ("idle",), self.db_pool.get_idle_size()
+
+        def user_log_rows():
+            if self.user_log_buffer is not None:
+                for result in ("written", "failed", "dropped"):
+                    yield (result,), getattr(self.user_log_buffer, f"rows_{result}")
+
+        def user_log_queue_depth():
+            if self.user_log_buffer is not None:
+                yield (), self.user_log_buffer.queue_depth
+
+        def user_log_last_flush():
+            if self.user_log_buffer is not None:
+                yield (), self.user_log_buffer.last_flush_seconds
+
+        metrics.counter(
+            "peterbot_cache_lookups_total",
+            "PeterPortal cache lookups, by cache and result",
+            ("cache", "result"),
+            cache_lookups,
+        )
+        metrics.gauge(
+            "peterbot_cache_hit_ratio",
+            "Share of lookups answered from cache",
+            ("cache",),
+            cache_hit_ratios,
+        )
+        metrics.counter(
+            "peterbot_peterportal_requests_total",
+            "PeterPortal requests sent, retried, given up on and rejected",
+            ("result",),
+            peterportal_requests,
+        )
+        metrics.gauge(
+            "peterbot_peterportal_circuit_open",
+            "Whether PeterPortal requests are being rejected",
+            collect=circuit_open,
+        )
+        metrics.gauge(
+            "peterbot_db_pool_connections",
+            "Database pool connections, open and idle",
+            ("state",),
+            pool_connections,
+        )
+        metrics.counter(
+            "peterbot_user_log_rows_total",
+            "Buffered user_logs rows written, lost to a failed flush or dropped full",
+            ("result",),
+            user_log_rows,
+        )
+        metrics.gauge(
+            "peterbot_user_log_queue_depth",
+            "user_logs rows waiting to be flushed",
+            collect=user_log_queue_depth,
+        )
+        metrics.gauge(
+            "peterbot_user_log_last_flush_seconds",
+            "Duration of the most recent user_logs flush",
+            collect=user_log_last_flush,
+        )
+
+    @contextmanager
+    def _startup_phase(self, phase: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - start
+
+    def run_in_background(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """
+        Schedules a coroutine that outlives the caller, keeping a reference to it
+
+        Parameters
+        ----------
+        coro : Coroutine
+            the coroutine to run
+
+        Returns
+        -------
+        asyncio.Task
+        """
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self._background_task_done)
+        return task
+
+    def _background_task_done(self, task: asyncio.Task) -> None:
+        self.background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error(
+                "background task %r failed",
+                task.get_coro(),
+                exc_info=task.exception(),
+            )
+
+    async def warm_catalogue_cache(self):
+        """
+        Restores persisted PeterPortal responses into the in-memory caches
+
+        Entries past their TTL are served stale and refreshed on first use.
+        """
+        entries = await loaders.request_catalogue_cache(self)
+        for key, (payload, age) in entries.items():
+            cache = self.course_cache if key.startswith("course:") else self.soc_cache
+            if key not in cache and age < cache.ttl + cache.stale_ttl:
+                cache.set(key, payload, age=age)
+            if cache is self.soc_cache:
+                params = parse_qs(key[len("soc:") :])
+                self.soc_completions.add_listing(params["term"][0], payload)
+        log.info("warmed %d catalogue cache entries", len(entries))
+
+    async def close(self):
+        """
+        Releases bot-lifetime resources before disconnecting
+
+        Functional override of discord.Client.close
+        """
+        if self.http_client is not None:
+            await self.http_client.close()
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+        if self.watchdog is not None:
+            self.watchdog.stop()
+        if self.cache_listener is not None:
+            await self.cache_listener.close()
+        if self.user_log_buffer is not None:
+            await self.user_log_buffer.close()
+        if self.db_pool is not None:
+            await self.db_pool.close()
+        await super().close()
 
     async def on_ready(self):
-        print(f"{self.user} online (ID: {self.user.id})")
-        print("-" * 88)
+        log.info("%s online (ID: %s)", self.user, self.user.id)
 
         activity = discord.Game("Watching over the anthill")
         await self.change_presence(status=discord.Status.online, activity=activity)
@@ -77,3 +542,9 @@ class PeterBot(commands.Bot):
     async def on_guild_join(self, guild):
         if guild.id not in self.peter_guilds:
             await writers.insert_guild(self, guild.id)
+        self.run_in_background(self.sync_guild(guild))
+
+    async def on_guild_available(self, guild):
+        if guild.id in self.unsynced_guilds:
+            self.unsynced_guilds.discard(guild.id)
+            self.run_in_background(self.sync_guild(guild))
@@ -0,0 +1,193 @@
+import asyncio
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Type
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after a time to live
+
+    Concurrent `get_or_fetch` calls for the same key share one in-flight fetch.
+    Expired entries still inside the stale window are served by `get_or_fetch`
+    while a refresh runs in the background (stale-while-revalidate). Entries of
+    any age are served when a fetch fails with one of `fallback_on`
+    (stale-if-error).
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of entries kept before the least recently used is evicted
+    ttl : float
+        Seconds an entry stays fresh
+    stale_ttl : float
+        (Optional) Seconds past expiry an entry may still be served. (Default=0)
+    fallback_on : Tuple[Type[BaseException], ...]
+        (Optional) Fetch errors answered with an expired entry, if there is one.
+        (Default=())
+
+    Attributes
+    ----------
+    hits : int
+        Lookups answered from the cache
+    stale_hits : int
+        Hits served from an expired entry while it was revalidated
+    misses : int
+        Lookups that had to fetch
+    coalesced : int
+        Misses that joined a fetch already in flight instead of starting one
+    fallback_hits : int
+        Failed fetches answered with an expired entry
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        stale_ttl: float = 0.0,
+        fallback_on: Tuple[Type[BaseException], ...] = (),
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.fallback_on = fallback_on
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.fallback_hits = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns a fresh cached value, marking it as recently used
+
+        Parameters
+        ----------
+        key : Hashable
+        default : Any
+            (Optional) value returned on a miss or expired entry
+
+        Returns
+        -------
+        Any
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[0] <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        age: float = 0.0,
+    ) -> None:
+        """
+        Stores a value, evicting the least recently used entry when full
+
+        Parameters
+        ----------
+        key : Hashable
+        value : Any
+        ttl : float
+            (Optional) overrides the cache's time to live for this entry
+        age : float
+            (Optional) seconds since the value was fetched, for values
+            restored from elsewhere. (Default=0)
+        """
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl) - age
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    async def get_or_fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Returns the cached value for key, calling fetch on a miss
+
+        Identical lookups made while a fetch is in flight await that same fetch.
+        A stale entry is returned immediately and refreshed in the background.
+
+        Parameters
+        ----------
+        key : Hashable
+        fetch : Callable[[], Awaitable[Any]]
+            coroutine factory producing the value to cache
+
+        Returns
+        -------
+        Any
+        """
+        entry = self._data.get(key)
+        if entry is not None:
+            expires, value = entry
+            now = time.monotonic()
+            if expires > now or expires + self.stale_ttl > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                if expires <= now:
+                    self.stale_hits += 1
+                    self._fetch(key, fetch)
+                return value
+            if not self.fallback_on:
+                del self._data[key]
+
+        self.misses += 1
+        try:
+            # Shielded so one cancelled caller doesn't cancel the fetch for the rest
+            return await asyncio.shield(self._fetch(key, fetch))
+        except self.fallback_on:
+            if entry is None:
+                raise
+            self.fallback_hits += 1
+            return entry[1]
+
+    def _fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]]
+    ) -> "asyncio.Future[Any]":
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._fetched, key))
+        else:
+            self.coalesced += 1
+        return task
+
+    def _fetched(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self.set(key, task.result())
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Any, Mapping, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from utils.metrics import HTTP_SECONDS
+
+
+class HTTPClient:
+    """Bot-lifetime HTTP client for outbound API calls (PeterPortal, etc.)
+
+    Wraps a single aiohttp.ClientSession so that every request shares one
+    keep-alive connection pool instead of paying TCP+TLS setup per call.
+
+    Parameters
+    ----------
+    limit : int
+        (Optional) Total number of pooled connections. (Default=100)
+    limit_per_host : int
+        (Optional) Number of pooled connections per host. (Default=10)
+    timeout : float
+        (Optional) Total seconds allowed per request. (Default=10.0)
+    connect_timeout : float
+        (Optional) Seconds allowed to establish a connection. (Default=5.0)
+    keepalive_timeout : float
+        (Optional) Seconds an idle connection is kept open. (Default=30.0)
+    dns_cache_ttl : int
+        (Optional) Seconds a DNS resolution is cached. (Default=300)
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+    ):
+        self._connector = aiohttp.TCPConnector(
+            limit=limit,
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=self._connector,
+            timeout=aiohttp.ClientTimeout(total=timeout, connect=connect_timeout),
+            raise_for_status=False,
+        )
+
+    @property
+    def closed(self) -> bool:
+        return self._session.closed
+
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[Mapping[str, str]] = None,
+        endpoint: Optional[str] = None,
+    ) -> Any:
+        """
+        Performs a GET request and decodes the JSON body
+
+        Parameters
+        ----------
+        url : str
+            the url to request
+        params : Mapping[str, str]
+            (Optional) query string parameters
+        endpoint : str
+            (Optional) Label the request is timed under, the url's path when
+            omitted. Pass one for urls holding ids. (Default=None)
+
+        Returns
+        -------
+        Any
+            the decoded JSON response
+
+        Raises
+        ------
+        aiohttp.ClientResponseError
+            when the response status is not 200
+        """
+        start = time.perf_counter()
+        status = "error"
+        try:
+            async with self._session.get(url, params=params) as resp:
+                status = str(resp.status)
+                if resp.status != 200:
+                    raise aiohttp.ClientResponseError(
+                        resp.request_info,
+                        resp.history,
+                        status=resp.status,
+                        message=resp.reason,
+                        headers=resp.headers,
+                    )
+                return await resp.json()
+        except asyncio.TimeoutError:
+            status = "timeout"
+            raise
+        finally:
+            HTTP_SECONDS.observe(
+                time.perf_counter() - start,
+                endpoint=endpoint or urlsplit(url).path,
+                status=status,
+            )
+
+    async def close(self) -> None:
+        """Closes the session and every pooled connection"""
+        if not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,340 @@
+import asyncio
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+# Label values -> value, produced when scraped
+Collector = Callable[[], Iterable[Tuple[LabelValues, float]]]
+
+# Seconds, from a fast cache hit to a slow PeterPortal search
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Metric:
+    """A named family of samples, one per combination of label values
+
+    Parameters
+    ----------
+    name : str
+        Prometheus metric name
+    documentation : str
+        HELP text
+    labelnames : Sequence[str]
+        (Optional) Label names, values are given in this order. (Default=())
+    collect : Collector
+        (Optional) Produces the samples when scraped, for values already
+        counted elsewhere. (Default=None)
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Collector] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+        self._values: Dict[LabelValues, float] = {}
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        """(suffix, label values, value) of every sample"""
+        values = self._collect() if self._collect is not None else self._values.items()
+        for key, value in values:
+            yield "", key, value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for suffix, key, value in self.samples():
+            yield f"{self.name}{suffix}{_labels(self.labelnames, key)} {value:g}"
+
+
+class Counter(Metric):
+    """A value that only goes up"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: object) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum
+
+    Parameters
+    ----------
+    buckets : Sequence[float]
+        (Optional) Upper bounds of the buckets. (Default=DEFAULT_BUCKETS)
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> (per bucket counts with a trailing +Inf, sum)
+        self._observed: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        key = self._key(labels)
+        observed = self._observed.get(key)
+        if observed is None:
+            observed = self._observed[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        observed[0][bisect.bisect_left(self.buckets, value)] += 1
+        observed[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        """Observes the seconds spent in the block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def series(self) -> Iterator[Tuple[LabelValues, int, float]]:
+        """(label values, count, sum) of every observed combination"""
+        for key, (counts, total) in self._observed.items():
+            yield key, sum(counts), total[0]
+
+    def quantile(self, q: float, key: LabelValues) -> float:
+        """
+        Estimates a quantile from the buckets, like Prometheus'
+        histogram_quantile
+
+        Parameters
+        ----------
+        q : float
+            the quantile, Ex: 0.95
+        key : LabelValues
+            label values of the series
+
+        Returns
+        -------
+        float
+            the estimate, the largest bucket bound if it falls past it
+        """
+        counts = self._observed[key][0]
+        rank = q * sum(counts)
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return 0.0
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, float]]:
+        for key, (counts, total) in self._observed.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield "_bucket", (*key, le), cumulative
+            yield "_sum", key, total[0]
+            yield "_count", key, cumulative
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for suffix, key, value in self.samples():
+            names = (*self.labelnames, "le") if suffix == "_bucket" else self.labelnames
+            yield f"{self.name}{suffix}{_labels(names, key)} {value:g}"
+
+
+def _labels(names: Sequence[str], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    """Metrics of the process, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds a metric, replacing one of the same name"""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    collect: Optional[Collector] = None,
+) -> Counter:
+    """Registers a counter with the process registry"""
+    return REGISTRY.register(Counter(name, documentation, labelnames, collect))
+
+
+def gauge(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    collect: Optional[Collector] = None,
+) -> Gauge:
+    """Registers a gauge with the process registry"""
+    return REGISTRY.register(Gauge(name, documentation, labelnames, collect))
+
+
+def histogram(
+    name: str, documentation: str, labelnames: Sequence[str] = ()
+) -> Histogram:
+    """Registers a histogram with the process registry"""
+    return REGISTRY.register(Histogram(name, documentation, labelnames))
+
+
+COMMAND_SECONDS = histogram(
+    "peterbot_command_seconds",
+    "Time spent running commands",
+    ("command", "kind", "status"),
+)
+DB_ACQUIRE_SECONDS = histogram(
+    "peterbot_db_acquire_seconds",
+    "Time spent waiting for a pool connection, by database function",
+    ("function",),
+)
+DB_HELD_SECONDS = histogram(
+    "peterbot_db_held_seconds",
+    "Time a pool connection was held running queries, by database function",
+    ("function",),
+)
+HTTP_SECONDS = histogram(
+    "peterbot_http_request_seconds",
+    "Outbound HTTP request latency, by endpoint and response status",
+    ("endpoint", "status"),
+)
+USER_LOG_FLUSH_SECONDS = histogram(
+    "peterbot_user_log_flush_seconds",
+    "Time spent writing a batch of buffered user_logs rows",
+)
+LOOP_LAG_SECONDS = histogram(
+    "peterbot_event_loop_lag_seconds",
+    "How late the event loop ran a timer scheduled to fire every interval",
+)
+
+
+async def monitor_loop_lag(interval: float = 0.5) -> None:
+    """
+    Samples event loop lag forever, as how late a periodic sleep wakes up
+
+    Parameters
+    ----------
+    interval : float
+        (Optional) Seconds between samples. (Default=0.5)
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG_SECONDS.observe(max(loop.time() - start - interval, 0.0))
+
+
+class MetricsServer:
+    """Serves the process registry at /metrics for Prometheus to scrape
+
+    Parameters
+    ----------
+    host : str
+        interface to listen on
+    port : int
+        port to listen on
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        log.info("serving metrics on http://%s:%d/metrics", self.host, self.port)
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            body=REGISTRY.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
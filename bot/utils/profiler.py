@@ -0,0 +1,226 @@
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache
+from types import FrameType
+from typing import Counter, Deque, Iterable, List, NamedTuple, Optional, TextIO, Tuple
+
+from utils import metrics
+
+log = logging.getLogger(__name__)
+
+LOOP_STALLS = metrics.counter(
+    "peterbot_event_loop_stalls_total",
+    "Times the event loop was blocked for longer than the watchdog threshold",
+)
+
+
+class Stall(NamedTuple):
+    """A time the event loop was blocked, and where it was blocked"""
+
+    at: datetime
+    seconds: float
+    stack: traceback.StackSummary
+
+
+@lru_cache(maxsize=1024)
+def _short_path(filename: str) -> str:
+    # The package and module are enough to find a frame, site-packages isn't
+    parent, name = os.path.split(filename)
+    return os.path.join(os.path.basename(parent), name)
+
+
+def frame_label(name: str, filename: str, lineno: Optional[int]) -> str:
+    """A frame as flamegraph tools show it, Ex: 'parse_courses (cogs/schedule.py:88)'"""
+    return f"{name} ({_short_path(filename)}:{lineno})".replace(";", ":")
+
+
+def collapse(frame: Optional[FrameType]) -> str:
+    """The stack ending in frame, outermost first, as a ';' separated line"""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(frame_label(code.co_name, code.co_filename, frame.f_lineno))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def collapse_summary(stack: traceback.StackSummary) -> str:
+    return ";".join(frame_label(fs.name, fs.filename, fs.lineno) for fs in stack)
+
+
+def write_collapsed(stacks: Iterable[Tuple[str, int]], file: TextIO) -> None:
+    """
+    Writes stacks in the collapsed format read by flamegraph.pl, speedscope and
+    inferno, one 'frame;frame;frame count' line per stack
+
+    Parameters
+    ----------
+    stacks : Iterable[Tuple[str, int]]
+        (collapsed stack, samples) pairs
+    file : TextIO
+        the file written to
+    """
+    for stack, count in stacks:
+        file.write(f"{stack} {count}\n")
+
+
+def sample_stacks(
+    thread_id: int, duration: float, interval: float = 0.005
+) -> Counter[str]:
+    """
+    Samples the stack of a thread until duration has passed, blocking the caller
+
+    Sampling only reads the thread's current frame, the sampled thread keeps
+    running and is never paused or traced.
+
+    Parameters
+    ----------
+    thread_id : int
+        identifier of the sampled thread, Ex: the event loop's
+    duration : float
+        seconds to sample for
+    interval : float
+        (Optional) Seconds between samples. (Default=0.005)
+
+    Returns
+    -------
+    Counter[str]
+        collapsed stack -> times it was sampled
+    """
+    samples: Counter[str] = collections.Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        samples[collapse(frame)] += 1
+        del frame
+        time.sleep(interval)
+    return samples
+
+
+class LoopWatchdog:
+    """Reports where the event loop is stuck whenever it stops responding
+
+    A daemon thread pings the loop with call_soon_threadsafe every `interval`
+    seconds. A ping still unanswered after `threshold` seconds means a callback
+    is blocking the loop, so the thread captures the loop thread's stack at that
+    moment, and once the loop answers the stall is logged with that stack and
+    kept, see `snapshot`.
+
+    asyncio's debug mode reports slow callbacks too, but only their name, and
+    slows every callback down, so it stays off in production.
+
+    Must be created on the thread running the loop.
+
+    Parameters
+    ----------
+    loop : asyncio.AbstractEventLoop
+        the loop watched
+    threshold : float
+        (Optional) Seconds the loop may be unresponsive before its stack is
+        captured. (Default=0.25)
+    interval : float
+        (Optional) Seconds between pings. (Default=0.1)
+    keep : int
+        (Optional) Most recent stalls kept. (Default=50)
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        threshold: float = 0.25,
+        interval: float = 0.1,
+        keep: int = 50,
+    ):
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        # Written by the watchdog thread, read on the loop, both under _lock
+        self._lock = threading.Lock()
+        self._stalls: Deque[Stall] = deque(maxlen=keep)
+        # Collapsed stack -> stalls caught in it, since startup
+        self._stacks: Counter[str] = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def snapshot(self) -> Tuple[List[Stall], List[Tuple[str, int]]]:
+        """
+        Copies of the recorded stalls, safe to use while the watchdog runs
+
+        Returns
+        -------
+        Tuple[List[Stall], List[Tuple[str, int]]]
+            the most recent stalls, oldest first, and (collapsed stack, stalls)
+            pairs since startup, most common first
+        """
+        with self._lock:
+            return list(self._stalls), self._stacks.most_common()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            answered = threading.Event()
+            sent = time.monotonic()
+            try:
+                self.loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                # The loop was closed
+                return
+            if answered.wait(self.threshold):
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = traceback.extract_stack(frame) if frame is not None else None
+            del frame
+            while not answered.wait(self.interval):
+                if self._stopped.is_set():
+                    return
+            if stack is not None:
+                self._record(time.monotonic() - sent, stack)
+
+    def _record(self, seconds: float, stack: traceback.StackSummary) -> None:
+        collapsed = collapse_summary(stack)
+        with self._lock:
+            self._stalls.append(Stall(datetime.now(timezone.utc), seconds, stack))
+            self._stacks[collapsed] += 1
+        LOOP_STALLS.inc()
+        log.warning(
+            "event loop blocked for %.3fs, stack after %.3fs:\n%s",
+            seconds,
+            self.threshold,
+            "".join(stack.format()),
+        )
+
+
+async def profile(
+    thread_id: int, duration: float, interval: float = 0.005
+) -> Counter[str]:
+    """
+    Samples the stack of a thread from another thread, see sample_stacks
+
+    Awaiting this on the event loop profiles the loop itself while it keeps
+    serving events.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, sample_stacks, thread_id, duration, interval
+    )
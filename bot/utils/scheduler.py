@@ -0,0 +1,275 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Tuple
+
+import aiohttp
+from utils.http import HTTPClient
+
+# Lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(aiohttp.ClientError):
+    """Raised instead of sending a request while the upstream is failing"""
+
+
+class RequestScheduler:
+    """Rate-limited, retrying front for requests to one upstream API
+
+    Requests take a token from a token bucket refilled at `rate` per second, so
+    bursts of commands are spread out instead of tripping upstream throttling.
+    Waiting interactive requests are always sent before background ones.
+    Identical GETs in flight at the same time are sent once.
+
+    429 and 5xx responses, timeouts and connection errors are retried with
+    exponential backoff and full jitter, honouring Retry-After unless it asks
+    for longer than `max_delay`, which fails the request at once. After
+    `failure_threshold` consecutive failed requests the circuit opens: requests
+    fail immediately with CircuitOpenError for `reset_timeout` seconds, letting
+    callers fall back to cached data. One trial request is then let through to
+    close it again.
+
+    Parameters
+    ----------
+    client : HTTPClient
+        the client requests are sent with
+    rate : float
+        (Optional) Requests per second. (Default=5.0)
+    burst : int
+        (Optional) Requests that may be sent back to back. (Default=10)
+    retries : int
+        (Optional) Retries of a failing request. (Default=3)
+    base_delay : float
+        (Optional) Seconds before the first retry, doubled per retry. (Default=0.5)
+    max_delay : float
+        (Optional) Longest wait between retries, also the longest Retry-After
+        honoured. (Default=10.0)
+    failure_threshold : int
+        (Optional) Consecutive failures that open the circuit. (Default=5)
+    reset_timeout : float
+        (Optional) Seconds the circuit stays open. (Default=30.0)
+    """
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        rate: float = 5.0,
+        burst: int = 10,
+        retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 10.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._waiters: List[Tuple[int, int, "asyncio.Future[None]"]] = []
+        self._order = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+        self.rejected = 0
+        self.coalesced = 0
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half-open'"""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[Mapping[str, str]] = None,
+        priority: int = INTERACTIVE,
+        endpoint: Optional[str] = None,
+    ) -> Any:
+        """
+        Performs a GET request through the scheduler and decodes the JSON body
+
+        Parameters
+        ----------
+        url : str
+            the url to request
+        params : Mapping[str, str]
+            (Optional) query string parameters
+        priority : int
+            (Optional) INTERACTIVE or BACKGROUND. (Default=INTERACTIVE)
+        endpoint : str
+            (Optional) Label the request is timed under, see HTTPClient.get_json.
+            (Default=None)
+
+        Returns
+        -------
+        Any
+            the decoded JSON response
+
+        Raises
+        ------
+        CircuitOpenError
+            when the upstream has been failing and the circuit is open
+        aiohttp.ClientError, asyncio.TimeoutError
+            when the request failed on its last attempt
+        """
+        key = (url, tuple(sorted(params.items())) if params else ())
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request(url, params, priority, endpoint))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _request(
+        self,
+        url: str,
+        params: Optional[Mapping[str, str]],
+        priority: int,
+        endpoint: Optional[str],
+    ) -> Any:
+        attempt = 0
+        # The circuit counts requests, not attempts: a request is one failure
+        # however many times it was retried
+        trial = self._check_circuit()
+        try:
+            while True:
+                try:
+                    await self._acquire(priority)
+                    self.requests += 1
+                    result = await self.client.get_json(
+                        url, params=params, endpoint=endpoint
+                    )
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    retry_after = self._retry_after(e)
+                    if retry_after is None:
+                        # The upstream answered, the request itself was bad
+                        self._record(success=True)
+                        raise
+                    # Waiting longer than max_delay would hold up the caller, the
+                    # cache can serve stale data instead
+                    if attempt >= self.retries or retry_after > self.max_delay:
+                        self.failed += 1
+                        self._record(success=False)
+                        raise
+                    attempt += 1
+                    self.retried += 1
+                    await asyncio.sleep(retry_after or self._backoff(attempt))
+                    # Other requests opened the circuit meanwhile, stop retrying
+                    if not trial and self.state == "open":
+                        self.rejected += 1
+                        raise CircuitOpenError("upstream is failing, circuit open")
+                else:
+                    self._record(success=True)
+                    return result
+        finally:
+            if trial:
+                self._trial = False
+
+    @staticmethod
+    def _retry_after(error: BaseException) -> Optional[float]:
+        """
+        None if the error isn't worth retrying, otherwise the delay the upstream
+        asked for, 0 when it didn't ask for one
+
+        Retry-After is either a number of seconds or an HTTP date.
+        """
+        if isinstance(error, aiohttp.ClientResponseError):
+            if error.status != 429 and error.status < 500:
+                return None
+            value = (error.headers or {}).get("Retry-After")
+            if value is None:
+                return 0.0
+            try:
+                return max(float(value), 0.0)
+            except ValueError:
+                pass
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return 0.0
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        return 0.0
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+    def _check_circuit(self) -> bool:
+        """Raises while the circuit is open, True if this request is the trial"""
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial):
+            self.rejected += 1
+            raise CircuitOpenError("upstream is failing, circuit open")
+        if state == "half-open":
+            # Others are rejected until the trial finishes
+            self._trial = True
+            return True
+        return False
+
+    def _record(self, success: bool) -> None:
+        if success:
+            self._failures = 0
+            self._opened_at = None
+            return
+        self._failures += 1
+        if self._failures >= self.failure_threshold or self._opened_at is not None:
+            if self._opened_at is None:
+                log.warning("circuit opened after %d failed requests", self._failures)
+            self._opened_at = time.monotonic()
+
+    async def _acquire(self, priority: int) -> None:
+        """Waits for a token, interactive requests first"""
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await waiter
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._refilled) * self.rate
+            )
+            self._refilled = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                # The caller was cancelled while waiting
+                continue
+            self._tokens -= 1
+            waiter.set_result(None)
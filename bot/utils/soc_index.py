@@ -0,0 +1,459 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date
+from itertools import islice
+from typing import (
+    AbstractSet,
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+_NONE: AbstractSet[int] = frozenset()
+
+# Flags SectionIndex.search can answer from a department or GE listing
+LOCAL_FILTERS = frozenset(
+    {
+        "courseNumber",
+        "division",
+        "sectionType",
+        "units",
+        "days",
+        "startTime",
+        "endTime",
+        "building",
+        "room",
+        "instructorName",
+    }
+)
+
+_DAYS = re.compile(r"Su|Sa|Th|Tu|T|M|W|F", re.IGNORECASE)
+_CANONICAL_DAYS = {
+    "su": "Su",
+    "sa": "Sa",
+    "th": "Th",
+    "tu": "Tu",
+    "t": "Tu",
+    "m": "M",
+    "w": "W",
+    "f": "F",
+}
+# 12hr time flag, Ex: 1:00PM
+_FLAG_TIME = re.compile(r"\s*(\d{1,2}):(\d{2})\s*([AaPp])[Mm]?\s*")
+# WebSoc meeting time, Ex: " 2:00- 3:20p", only the end carries the pm marker
+_MEETING_TIME = re.compile(r"\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*([ap]?)")
+_NUMBER = re.compile(r"\D*(\d*)")
+_DIVISIONS = {"LowerDiv": (0, 100), "UpperDiv": (100, 200), "Graduate": (200, 1000)}
+
+
+def iter_courses(payload: Mapping[str, Any]) -> Iterator[Mapping[str, Any]]:
+    """Course dicts of a SOC response, in response order"""
+    for school in payload["schools"]:
+        for dept in school["departments"]:
+            yield from dept["courses"]
+
+
+def parse_days(days: str) -> Set[str]:
+    """Ex: 'MWF' -> {'M', 'W', 'F'}, 'TuTh' -> {'Tu', 'Th'}"""
+    return {_CANONICAL_DAYS[d.lower()] for d in _DAYS.findall(days)}
+
+
+def parse_flag_time(value: str) -> Optional[int]:
+    """Minutes past midnight of a 12hr time flag, None when malformed"""
+    match = _FLAG_TIME.fullmatch(value)
+    if match is None:
+        return None
+    hour, minute = int(match[1]), int(match[2])
+    if not 1 <= hour <= 12 or minute > 59:
+        return None
+    return hour % 12 * 60 + minute + (720 if match[3].lower() == "p" else 0)
+
+
+def parse_meeting_time(value: str) -> Optional[Tuple[int, int]]:
+    """(start, end) minutes past midnight of a WebSoc meeting time, None for TBA"""
+    match = _MEETING_TIME.match(value)
+    if match is None:
+        return None
+    start = int(match[1]) % 12 * 60 + int(match[2])
+    end = int(match[3]) % 12 * 60 + int(match[4])
+    if match[5] == "p":
+        end += 720
+        # " 2:00- 3:20p" starts in the afternoon, "11:00-12:20p" doesn't
+        if start + 720 <= end:
+            start += 720
+    return start, end
+
+
+def local_scope(params: Mapping[str, str]) -> Optional[Dict[str, str]]:
+    """
+    The listing that answers a SOC query locally, if there is one
+
+    A query is covered when it names a GE category or a department and every
+    other flag is one SectionIndex.search can apply.
+
+    Parameters
+    ----------
+    params : Mapping[str, str]
+        SOC query parameters, including the term
+
+    Returns
+    -------
+    dict
+        parameters of the covering GE or department listing, None if uncovered
+    """
+    scope = "ge" if "ge" in params else "department" if "department" in params else None
+    if scope is None:
+        return None
+    rest = params.keys() - {"term", scope}
+    if scope == "ge":
+        # Answered by the department index of the GE listing
+        rest.discard("department")
+    if not rest <= LOCAL_FILTERS:
+        return None
+    number = params.get("courseNumber", "")
+    if "-" in number or "," in number:
+        return None
+    for flag in ("startTime", "endTime"):
+        if flag in params and parse_flag_time(params[flag]) is None:
+            return None
+    if "division" in params and params["division"] not in (*_DIVISIONS, "ALL"):
+        return None
+    return {"term": params["term"], scope: params[scope].upper()}
+
+
+class SectionIndex:
+    """Inverted indexes over the sections of one SOC listing
+
+    Built once per response, searches never copy the listing beyond the matched
+    courses.
+
+    Parameters
+    ----------
+    payload : Mapping[str, Any]
+        a SOC response, as returned by PeterPortal
+    """
+
+    __slots__ = (
+        "courses",
+        "sections",
+        "by_department",
+        "by_instructor",
+        "by_building",
+        "by_day",
+        "by_section_type",
+        "by_units",
+        "numbers",
+        "starts",
+        "ends",
+    )
+
+    def __init__(self, payload: Mapping[str, Any]):
+        self.courses: List[Mapping[str, Any]] = []
+        # (position in courses, section)
+        self.sections: List[Tuple[int, Mapping[str, Any]]] = []
+        self.by_department: Dict[str, Set[int]] = {}
+        self.by_instructor: Dict[str, Set[int]] = {}
+        self.by_building: Dict[str, Set[int]] = {}
+        self.by_day: Dict[str, Set[int]] = {}
+        self.by_section_type: Dict[str, Set[int]] = {}
+        # Variable unit sections are also filed under 'VAR'
+        self.by_units: Dict[str, Set[int]] = {}
+        # Numeric part of each course's number, Ex: 32A -> 32
+        self.numbers: List[int] = []
+        # Sorted (minutes, section) pairs, one per timed meeting
+        self.starts: List[Tuple[int, int]] = []
+        self.ends: List[Tuple[int, int]] = []
+
+        for course in iter_courses(payload):
+            position = len(self.courses)
+            self.courses.append(course)
+            self.numbers.append(int(_NUMBER.match(course["courseNumber"])[1] or 0))
+            department = course["deptCode"].upper()
+            for section in course["sections"]:
+                section_id = len(self.sections)
+                self.sections.append((position, section))
+                self.by_department.setdefault(department, set()).add(section_id)
+                section_type = section.get("sectionType", "").upper()
+                self.by_section_type.setdefault(section_type, set()).add(section_id)
+                units = str(section.get("units", ""))
+                self.by_units.setdefault(units, set()).add(section_id)
+                if "-" in units:
+                    self.by_units.setdefault("VAR", set()).add(section_id)
+                for instructor in section.get("instructors", ()):
+                    last_name = instructor.split(",")[0].strip().upper()
+                    self.by_instructor.setdefault(last_name, set()).add(section_id)
+                for meeting in section.get("meetings", ()):
+                    building = meeting.get("bldg", "").split()
+                    if building:
+                        self.by_building.setdefault(building[0].upper(), set()).add(
+                            section_id
+                        )
+                    for day in parse_days(meeting.get("days", "")):
+                        self.by_day.setdefault(day, set()).add(section_id)
+                    times = parse_meeting_time(meeting.get("time", ""))
+                    if times is not None:
+                        self.starts.append((times[0], section_id))
+                        self.ends.append((times[1], section_id))
+        self.starts.sort()
+        self.ends.sort()
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    def search(self, params: Mapping[str, str]) -> Iterator[Mapping[str, Any]]:
+        """
+        Courses of the listing with only the sections matching every flag
+
+        Only call with queries `local_scope` covers. Courses are produced as they
+        are consumed, so stopping early skips the rest of the listing.
+
+        Parameters
+        ----------
+        params : Mapping[str, str]
+            SOC query parameters
+
+        Yields
+        ------
+        dict
+            course dicts shaped like the API's, in listing order
+        """
+        postings: List[AbstractSet[int]] = []
+        if "department" in params:
+            postings.append(self.by_department.get(params["department"].upper(), _NONE))
+        if "instructorName" in params:
+            key = params["instructorName"].upper()
+            postings.append(self.by_instructor.get(key, _NONE))
+        if "building" in params:
+            postings.append(self.by_building.get(params["building"].upper(), _NONE))
+        for day in parse_days(params.get("days", "")):
+            postings.append(self.by_day.get(day, _NONE))
+        if params.get("sectionType", "ALL").upper() != "ALL":
+            key = params["sectionType"].upper()
+            postings.append(self.by_section_type.get(key, _NONE))
+        if "units" in params:
+            postings.append(self.by_units.get(params["units"].upper(), _NONE))
+        if "startTime" in params:
+            start = bisect_left(self.starts, (parse_flag_time(params["startTime"]), -1))
+            postings.append({section_id for _, section_id in self.starts[start:]})
+        if "endTime" in params:
+            end = bisect_right(
+                self.ends, (parse_flag_time(params["endTime"]), len(self.sections))
+            )
+            postings.append({section_id for _, section_id in self.ends[:end]})
+
+        # Intersect smallest first, postings holding every section narrow nothing
+        postings = [p for p in postings if len(p) < len(self.sections)]
+        postings.sort(key=len)
+        if postings:
+            section_ids = sorted(postings[0].intersection(*postings[1:]))
+        else:
+            section_ids = range(len(self.sections))
+
+        # Sections are stored in listing order, each course's are contiguous
+        current = -1
+        matched: List[Mapping[str, Any]] = []
+        for section_id in section_ids:
+            position, section = self.sections[section_id]
+            if not self._matches(position, section, params):
+                continue
+            if position != current:
+                if matched:
+                    yield {**self.courses[current], "sections": matched}
+                current, matched = position, []
+            matched.append(section)
+        if matched:
+            yield {**self.courses[current], "sections": matched}
+
+    def _matches(
+        self, position: int, section: Mapping[str, Any], params: Mapping[str, str]
+    ) -> bool:
+        """Flags without an index"""
+        if "courseNumber" in params:
+            number = self.courses[position]["courseNumber"]
+            if number.upper() != params["courseNumber"].upper():
+                return False
+        division = params.get("division", "ALL")
+        if division != "ALL":
+            low, high = _DIVISIONS[division]
+            if not low <= self.numbers[position] < high:
+                return False
+        if "room" in params and not any(
+            meeting.get("bldg", "").split()[-1:] == [params["room"]]
+            for meeting in section.get("meetings", ())
+        ):
+            return False
+        return True
+
+
+class SocIndex:
+    """Section indexes of recently searched SOC listings
+
+    Indexes are keyed by the listing's cache key and rebuilt whenever the cached
+    response is replaced, so they are never fresher or staler than bot.soc_cache.
+
+    Parameters
+    ----------
+    maxsize : int
+        (Optional) Listings kept indexed. (Default=64)
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._indexes: "OrderedDict[str, Tuple[Any, SectionIndex]]" = OrderedDict()
+        self.hits = 0
+        self.builds = 0
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def get(self, key: str, payload: Mapping[str, Any]) -> SectionIndex:
+        """
+        The index of a listing, built if the listing is new or has changed
+
+        Parameters
+        ----------
+        key : str
+            cache key of the listing
+        payload : Mapping[str, Any]
+            the listing's current SOC response
+
+        Returns
+        -------
+        SectionIndex
+        """
+        entry = self._indexes.get(key)
+        if entry is not None and entry[0] is payload:
+            self._indexes.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        index = SectionIndex(payload)
+        self.builds += 1
+        self._indexes[key] = (payload, index)
+        self._indexes.move_to_end(key)
+        while len(self._indexes) > self.maxsize:
+            self._indexes.popitem(last=False)
+        return index
+
+
+# GE categories PeterPortal accepts
+GE_CATEGORIES = (
+    "GE-1A",
+    "GE-1B",
+    "GE-2",
+    "GE-3",
+    "GE-4",
+    "GE-5A",
+    "GE-5B",
+    "GE-6",
+    "GE-7",
+    "GE-8",
+)
+# Quarters as PeterPortal spells them
+QUARTERS = ("Winter", "Spring", "Summer1", "Summer10wk", "Summer2", "Fall")
+
+
+class SearchCompletions:
+    """Terms, departments and instructors seen in SOC listings, for autocomplete
+
+    Fed with every listing fetched from PeterPortal or restored from the
+    catalogue cache, so suggestions never wait on the API. Lookups are a
+    binary search over sorted keys.
+    """
+
+    def __init__(self):
+        self.terms: Set[str] = set()
+        # Department code -> name, Ex: 'I&C SCI' -> 'Information and Computer Science'
+        self.departments: Dict[str, str] = {}
+        # Upper-cased last name -> last name as listed
+        self.instructors: Dict[str, str] = {}
+        self._sorted_departments: Optional[List[str]] = None
+        self._sorted_instructors: Optional[List[str]] = None
+
+    def add_listing(self, term: str, payload: Mapping[str, Any]) -> None:
+        """
+        Records the term, departments and instructors of a SOC response
+
+        Parameters
+        ----------
+        term : str
+            term of the listing, Ex: 2022 Fall
+        payload : Mapping[str, Any]
+            a SOC response, as returned by PeterPortal
+        """
+        self.terms.add(term)
+        for school in payload["schools"]:
+            for dept in school["departments"]:
+                code = dept.get("deptCode")
+                if code is None and dept["courses"]:
+                    code = dept["courses"][0]["deptCode"]
+                if code and code not in self.departments:
+                    self.departments[code] = dept.get("deptName", "")
+                    self._sorted_departments = None
+                for course in dept["courses"]:
+                    for section in course["sections"]:
+                        for instructor in section.get("instructors", ()):
+                            last_name = instructor.split(",")[0].strip()
+                            key = last_name.upper()
+                            if key and key != "STAFF" and key not in self.instructors:
+                                self.instructors[key] = last_name
+                                self._sorted_instructors = None
+
+    def complete_term(self, prefix: str, today: date, limit: int = 25) -> List[str]:
+        """Terms seen in listings, then the terms of this year and the next"""
+        candidates = sorted(self.terms, reverse=True)
+        for year in (today.year, today.year + 1):
+            candidates.extend(f"{year} {quarter}" for quarter in QUARTERS)
+        prefix = prefix.strip().lower()
+        matches: List[str] = []
+        for term in candidates:
+            if term.lower().startswith(prefix) and term not in matches:
+                matches.append(term)
+                if len(matches) == limit:
+                    break
+        return matches
+
+    def complete_department(
+        self, prefix: str, limit: int = 25
+    ) -> List[Tuple[str, str]]:
+        """(code, name) of departments whose code starts with a prefix"""
+        if self._sorted_departments is None:
+            self._sorted_departments = sorted(self.departments)
+        return [
+            (code, self.departments[code])
+            for code in _prefixed(self._sorted_departments, prefix.upper(), limit)
+        ]
+
+    def complete_instructor(self, prefix: str, limit: int = 25) -> List[str]:
+        """Last names of instructors starting with a prefix"""
+        if self._sorted_instructors is None:
+            self._sorted_instructors = sorted(self.instructors)
+        return [
+            self.instructors[key]
+            for key in _prefixed(self._sorted_instructors, prefix.upper(), limit)
+        ]
+
+    @staticmethod
+    def complete_ge(prefix: str) -> List[str]:
+        """GE categories starting with a prefix, Ex: '5' or 'ge-5' -> GE-5A, GE-5B"""
+        prefix = prefix.strip().upper()
+        if not prefix.startswith("GE"):
+            prefix = "GE-" + prefix
+        return [ge for ge in GE_CATEGORIES if ge.startswith(prefix)]
+
+
+def _prefixed(keys: List[str], prefix: str, limit: int) -> List[str]:
+    """Sorted keys starting with a prefix"""
+    prefix = prefix.strip()
+    start = bisect_left(keys, prefix)
+    matches = []
+    for key in islice(keys, start, None):
+        if not key.startswith(prefix) or len(matches) == limit:
+            break
+        matches.append(key)
+    return matches
@@ -1,27 +1,136 @@
 CREATE TABLE IF NOT EXISTS guilds (
     guild_id BIGINT PRIMARY KEY,
-    watch_mode BOOLEAN
+    watch_mode BOOLEAN,
+    -- Days user_logs are kept for, NULL keeps them forever
+    log_retention_days INTEGER CHECK (log_retention_days > 0)
 );
+-- Added after guilds was first created
+ALTER TABLE guilds
+    ADD COLUMN IF NOT EXISTS log_retention_days INTEGER CHECK (log_retention_days > 0);
 
+-- A user is registered once per guild they are seen in
 CREATE TABLE IF NOT EXISTS users (
-    user_id BIGINT PRIMARY KEY,
-    guild_id BIGINT REFERENCES guilds(guild_id)
+    user_id BIGINT,
+    guild_id BIGINT REFERENCES guilds(guild_id),
+    PRIMARY KEY (user_id, guild_id)
 );
 
+-- users was first keyed on user_id alone
+DO $$
+DECLARE
+    pkey TEXT;
+BEGIN
+    SELECT conname INTO pkey
+        FROM pg_constraint
+        WHERE conrelid = 'users'::regclass
+            AND contype = 'p'
+            AND array_length(conkey, 1) = 1;
+    IF pkey IS NULL THEN
+        RETURN;
+    END IF;
+    -- Also drops the user_logs foreign key to it
+    EXECUTE format('ALTER TABLE users DROP CONSTRAINT %I CASCADE', pkey);
+    DELETE FROM users WHERE guild_id IS NULL;
+    ALTER TABLE users ADD PRIMARY KEY (user_id, guild_id);
+    -- An already partitioned user_logs is kept, and references the new key
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('user_logs')) = 'p' THEN
+        INSERT INTO users (user_id, guild_id)
+            SELECT DISTINCT user_id, guild_id
+            FROM user_logs
+            WHERE user_id IS NOT NULL AND guild_id IS NOT NULL
+            ON CONFLICT DO NOTHING;
+        ALTER TABLE user_logs
+            ADD FOREIGN KEY (user_id, guild_id) REFERENCES users(user_id, guild_id);
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS channels (
     channel_id BIGINT PRIMARY KEY,
     guild_id BIGINT REFERENCES guilds(guild_id)
 );
 
+-- Databases created before user_logs was partitioned hold it as a plain table,
+-- it is moved aside here and copied into the partitioned table below
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('user_logs')) = 'r' THEN
+        ALTER TABLE user_logs RENAME TO user_logs_unpartitioned;
+    END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS user_logs (
-    user_id BIGINT REFERENCES users(user_id),
+    log_id BIGSERIAL,
+    user_id BIGINT,
     channel_id BIGINT REFERENCES channels(channel_id),
     guild_id BIGINT REFERENCES guilds(guild_id),
     message_id BIGINT,
     msg TEXT,
     msg_type TEXT,
-    msg_date TIMESTAMP
-);
+    msg_date TIMESTAMP NOT NULL,
+    PRIMARY KEY (msg_date, log_id),
+    FOREIGN KEY (user_id, guild_id) REFERENCES users(user_id, guild_id)
+) PARTITION BY RANGE (msg_date);
+
+-- Serves per user lookups and keyset pagination newest first
+CREATE INDEX IF NOT EXISTS user_logs_guild_user_date_idx
+    ON user_logs (guild_id, user_id, msg_date DESC, log_id DESC);
+
+-- Catches rows outside every monthly partition
+CREATE TABLE IF NOT EXISTS user_logs_default PARTITION OF user_logs DEFAULT;
+
+-- Monthly partitions are named user_logs_yYYYYmMM
+CREATE OR REPLACE FUNCTION create_user_logs_partition(month DATE) RETURNS TEXT AS $$
+DECLARE
+    start_date DATE := date_trunc('month', month);
+    partition_name TEXT := 'user_logs_y' || to_char(start_date, 'YYYY"m"MM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF user_logs FOR VALUES FROM (%L) TO (%L)',
+        partition_name,
+        start_date,
+        (start_date + INTERVAL '1 month')::DATE
+    );
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_user_logs_partition(CURRENT_DATE);
+SELECT create_user_logs_partition((CURRENT_DATE + INTERVAL '1 month')::DATE);
+
+DO $$
+DECLARE
+    skipped BIGINT;
+BEGIN
+    IF to_regclass('user_logs_unpartitioned') IS NULL THEN
+        RETURN;
+    END IF;
+    PERFORM create_user_logs_partition(month::DATE)
+        FROM (
+            SELECT DISTINCT date_trunc('month', msg_date) AS month
+            FROM user_logs_unpartitioned
+            WHERE msg_date IS NOT NULL
+        ) months;
+    -- Logged users were registered in a single guild, user_logs references every
+    -- (user, guild) pair it holds
+    INSERT INTO users (user_id, guild_id)
+        SELECT DISTINCT user_id, guild_id
+        FROM user_logs_unpartitioned
+        WHERE user_id IS NOT NULL AND guild_id IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    -- log_id is backfilled from its sequence, oldest messages first
+    INSERT INTO user_logs (
+        user_id, channel_id, guild_id, message_id, msg, msg_type, msg_date
+    )
+        SELECT user_id, channel_id, guild_id, message_id, msg, msg_type, msg_date
+        FROM user_logs_unpartitioned
+        WHERE msg_date IS NOT NULL
+        ORDER BY msg_date;
+    SELECT count(*) INTO skipped FROM user_logs_unpartitioned WHERE msg_date IS NULL;
+    IF skipped > 0 THEN
+        RAISE NOTICE 'dropped % user_logs rows without a msg_date', skipped;
+    END IF;
+    DROP TABLE user_logs_unpartitioned;
+END $$;
 
 CREATE TABLE IF NOT EXISTS voice_channels (
     voice_id BIGINT PRIMARY KEY,
@@ -32,6 +141,50 @@ CREATE TABLE IF NOT EXISTS voice_channels (
 
 CREATE TABLE IF NOT EXISTS catalogue_alias (
     guild_id BIGINT REFERENCES guilds(guild_id),
-    department TEXT PRIMARY KEY,
-    alias TEXT
+    department TEXT NOT NULL,
+    alias TEXT,
+    PRIMARY KEY (guild_id, alias)
+);
+
+-- catalogue_alias was first keyed on department, allowing one alias per
+-- department across every guild
+DO $$
+DECLARE
+    pkey TEXT;
+BEGIN
+    SELECT conname INTO pkey
+        FROM pg_constraint
+        WHERE conrelid = 'catalogue_alias'::regclass
+            AND contype = 'p'
+            AND array_length(conkey, 1) = 1;
+    IF pkey IS NULL THEN
+        RETURN;
+    END IF;
+    EXECUTE format('ALTER TABLE catalogue_alias DROP CONSTRAINT %I', pkey);
+    DELETE FROM catalogue_alias
+        WHERE guild_id IS NULL OR alias IS NULL OR department IS NULL;
+    -- Aliases are stored normalized, see database.cache.normalize_alias
+    UPDATE catalogue_alias
+        SET alias = lower(regexp_replace(btrim(alias), '\s+', ' ', 'g')),
+            department = upper(department);
+    DELETE FROM catalogue_alias a
+        USING catalogue_alias b
+        WHERE a.guild_id = b.guild_id AND a.alias = b.alias AND a.ctid < b.ctid;
+    ALTER TABLE catalogue_alias ALTER COLUMN department SET NOT NULL;
+    ALTER TABLE catalogue_alias ADD PRIMARY KEY (guild_id, alias);
+END $$;
+
+CREATE TABLE IF NOT EXISTS catalogue_cache (
+    cache_key TEXT PRIMARY KEY,
+    payload JSONB NOT NULL,
+    fetched_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+);
+
+-- Sections users are DMed about when their enrollment changes
+CREATE TABLE IF NOT EXISTS section_watches (
+    user_id BIGINT,
+    term TEXT,
+    section_code TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    PRIMARY KEY (user_id, term, section_code)
 );
@@ -36,6 +36,7 @@ packages = [
     "bot",
     "bot.cogs",
     "bot.database",
+    "bot.utils",
 ]
 
 setup(